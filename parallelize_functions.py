@@ -26,4 +26,83 @@ pics = util.view_as_windows(hubble, (width, hubble.shape[1], hubble.shape[2]), s
 
 from joblib import Parallel, delayed
 def joblib_loop():
-    Parallel(n_jobs=4)(delayed(task)(i) for i in pics)
\ No newline at end of file
+    Parallel(n_jobs=4)(delayed(task)(i) for i in pics)
+
+# Building a HOG feature dataset
+'''
+To train a detector we need the HOG descriptors of a whole directory of images, which may not fit in memory and may take long enough that the run gets interrupted. So the extraction below:
+
+* resizes every image to the same canonical shape, so every descriptor has the same length
+* computes the descriptor only (visualize=False: the HOG image is not needed for training and is expensive)
+* runs in a pool of processes, each writing its rows directly into a preallocated float32 feature matrix on disk (a .npy file opened as a memory map)
+* writes an index file listing the image of every row, and marks the rows of a chunk done only after they have been flushed to disk (once per chunk, not per row), so an interrupted run starts again where it stopped
+'''
+import os
+import json
+import glob
+import numpy as np
+from skimage import io
+from skimage.transform import resize
+
+
+def _hog_rows(paths, rows, output, shape, hog_kwargs):
+    """
+    Compute and store the descriptors of paths in rows of the feature
+    matrix, marking the rows done together once they are on disk.
+    """
+    features = np.load(output + '.npy', mmap_mode='r+')
+    for path, row in zip(paths, rows):
+        image = resize(io.imread(path, as_grey=True), shape, mode='reflect')
+        features[row] = hog(image, **hog_kwargs)
+    features.flush()
+    done = np.load(output + '_done.npy', mmap_mode='r+')
+    done[rows] = 1
+    done.flush()
+
+
+def extract_hog_features(image_dir, output, shape=(128, 128), n_jobs=4,
+                         chunk_size=16, **hog_kwargs):
+    """
+    Write the HOG descriptors of all images in image_dir to output.npy, one
+    row per image listed in output_index.json, resuming a previous run
+    with the same images and parameters. Returns the feature matrix.
+    """
+    paths = sorted(p for p in glob.glob(os.path.join(image_dir, '*'))
+                   if p.lower().endswith(('.jpg', '.jpeg', '.png', '.tif', '.bmp')))
+    n_features = hog(np.zeros(shape), **hog_kwargs).size
+    # through json and back, so that tuples compare equal to the saved lists
+    index = json.loads(json.dumps(dict(files=paths, shape=shape, hog=hog_kwargs,
+                                       n_features=n_features)))
+    index_file = output + '_index.json'
+    resume = False
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            resume = json.load(f) == index
+    if not resume:
+        np.lib.format.open_memmap(output + '.npy', mode='w+', dtype=np.float32,
+                                  shape=(len(paths), n_features))
+        np.lib.format.open_memmap(output + '_done.npy', mode='w+',
+                                  dtype=np.uint8, shape=(len(paths),))
+        with open(index_file, 'w') as f:
+            json.dump(index, f, indent=1)
+    todo = np.flatnonzero(np.load(output + '_done.npy') == 0)
+    print('%d of %d images to do' % (len(todo), len(paths)))
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    Parallel(n_jobs=n_jobs)(
+        delayed(_hog_rows)([paths[row] for row in rows], rows, output,
+                           shape, hog_kwargs)
+        for rows in chunks)
+    return np.load(output + '.npy', mmap_mode='r')
+
+
+output_dir = 'output'
+
+if __name__ == '__main__':
+    hog_kwargs = dict(orientations=8, pixels_per_cell=(16, 16),
+                      cells_per_block=(1, 1))
+    os.makedirs(output_dir, exist_ok=True)
+    output = os.path.join(output_dir, 'hog_features')
+    features = extract_hog_features('./images', output, **hog_kwargs)
+    print(features.shape, features.dtype)
+    # a second run finds every row done and returns at once
+    features = extract_hog_features('./images', output, **hog_kwargs)
@@ -175,4 +175,271 @@ label_im = np.searchsorted(labels, label_im)
 # Locate one of the objects
 slice_x, slice_y = ndimage.find_objects(label_im==4)[0]
 roi = im[slice_x, slice_y]
-plt.imshow(roi)
\ No newline at end of file
+plt.imshow(roi)
+
+# Measuring all objects in one pass
+'''
+ndimage.sum(mask, label_im, ...) and ndimage.sum(im, label_im, ...) above each make a full pass over the image, and so would ndimage.mean, ndimage.minimum, ndimage.variance or ndimage.find_objects. With 10^5 - 10^6 objects it is much cheaper to read each block of rows once and update every statistic of every label from it: np.bincount gives the pixel counts, sums and sums of squares (hence mean and variance), and np.minimum.at / np.maximum.at the extrema and bounding boxes. The result is a columnar table (a dict of arrays, one row per label) like skimage.measure.regionprops_table.
+'''
+def measure_labels(label_im, *images, n_labels=None, block_rows=256):
+    """
+    Area, bounding box and, for every intensity image, the sum, mean, min,
+    max and variance of each label 1..n_labels, in a single pass.
+    """
+    if n_labels is None:
+        n_labels = int(label_im.max())
+    n = n_labels + 1
+    height, width = label_im.shape
+    area = np.zeros(n, dtype=np.int64)
+    bbox = [np.full(n, height), np.full(n, width),
+            np.zeros(n, dtype=np.intp), np.zeros(n, dtype=np.intp)]
+    sums = [np.zeros(n) for _ in images]
+    squares = [np.zeros(n) for _ in images]
+    minima = [np.full(n, np.inf) for _ in images]
+    maxima = [np.full(n, -np.inf) for _ in images]
+    columns = np.arange(width)
+
+    for r0 in range(0, height, block_rows):
+        labels = label_im[r0:r0 + block_rows].ravel()
+        block_height = len(labels) // width
+        rows = np.repeat(np.arange(r0, r0 + block_height), width)
+        cols = np.tile(columns, block_height)
+        area += np.bincount(labels, minlength=n)
+        np.minimum.at(bbox[0], labels, rows)
+        np.minimum.at(bbox[1], labels, cols)
+        np.maximum.at(bbox[2], labels, rows + 1)
+        np.maximum.at(bbox[3], labels, cols + 1)
+        for k, image in enumerate(images):
+            values = image[r0:r0 + block_rows].ravel().astype(np.float64)
+            sums[k] += np.bincount(labels, weights=values, minlength=n)
+            squares[k] += np.bincount(labels, weights=values**2, minlength=n)
+            np.minimum.at(minima[k], labels, values)
+            np.maximum.at(maxima[k], labels, values)
+
+    table = {'label': np.arange(1, n), 'area': area[1:]}
+    for i in range(4):
+        table['bbox-%d' % i] = bbox[i][1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for k in range(len(images)):
+            mean = sums[k] / area
+            table['sum-%d' % k] = sums[k][1:]
+            table['mean-%d' % k] = mean[1:]
+            table['min-%d' % k] = minima[k][1:]
+            table['max-%d' % k] = maxima[k][1:]
+            table['variance-%d' % k] = np.maximum(squares[k] / area - mean**2,
+                                                  0)[1:]
+    return table
+
+
+label_im, nb_labels = ndimage.label(mask)
+table = measure_labels(label_im, im, n_labels=nb_labels)
+print(table['area'], table['mean-0'])
+# Keep big objects and relabel them 1..K straight from the table
+keep = np.zeros(nb_labels + 1, dtype=bool)
+keep[1:] = table['area'] >= 1000
+new_label = np.zeros(nb_labels + 1, dtype=label_im.dtype)
+new_label[keep] = np.arange(1, keep.sum() + 1)
+label_im = new_label[label_im]
+plt.imshow(label_im)
+
+# Gaussian blurs whose cost does not depend on sigma
+'''
+The filtering section above calls gaussian_filter at sigma 3 and 5, and once more at sigma 1 on the sigma-3 result for sharpening. Each call convolves from scratch with a kernel 8 sigma wide, so large blurs are slow, and a pipeline that needs several sigmas of the same image (unsharp masking, difference of Gaussians, scale spaces) repeats work.
+
+gaussian() has a recursive mode: the Young - van Vliet filter approximates the Gaussian with a third order IIR filter run forward and then backward along each axis (scipy.signal.lfilter, in float32), so every output pixel costs the same handful of operations whatever sigma is. The approximation is within a few percent of the Gaussian's peak, up to about 8 gray levels out of 255 around sigma 5 and 1 or 2 at sigma 20 and above. Note also that the recursive filter extends the image edges as constant, whereas gaussian_filter reflects them, so the two differ near the border. On a 512 x 512 image the recursive filter takes the same time at every sigma, which matches gaussian_filter around sigma 5, is about twice as fast at sigma 10 and five times as fast at 30. By default ('auto') sigma below 10 therefore still goes to the exact gaussian_filter.
+
+gaussian_scale_space() caches the blurs of one image. Blurring twice adds the variances, so a new sigma is computed from the largest cached smaller one with sqrt(sigma**2 - cached**2): the sigma-1 blur of the sigma-3 image used for sharpening is simply the sigma sqrt(10) blur.
+'''
+import time
+from scipy import signal
+
+
+def _young_van_vliet(sigma):
+    """
+    Recursion coefficients (b, a) of the Young - van Vliet Gaussian.
+    """
+    if sigma >= 2.5:
+        q = 0.98711 * sigma - 0.96330
+    else:
+        q = 3.97156 - 4.14554 * np.sqrt(1 - 0.26891 * sigma)
+    b0 = 1.57825 + 2.44413 * q + 1.4281 * q ** 2 + 0.422205 * q ** 3
+    b1 = 2.44413 * q + 2.85619 * q ** 2 + 1.26661 * q ** 3
+    b2 = -(1.4281 * q ** 2 + 1.26661 * q ** 3)
+    b3 = 0.422205 * q ** 3
+    a = np.array([1, -b1 / b0, -b2 / b0, -b3 / b0])
+    return np.array([a.sum()]), a
+
+
+def _recursive_gaussian_1d(x, sigma, axis):
+    b, a = _young_van_vliet(sigma)
+    b, a = b.astype(np.float32), a.astype(np.float32)
+    # lfilter is much faster along the contiguous last axis
+    x = np.ascontiguousarray(np.moveaxis(x, axis, -1))
+    zi = signal.lfilter_zi(b, a).astype(np.float32)
+    for _ in range(2):
+        # start each pass in the steady state of a constant edge
+        x, _ = signal.lfilter(b, a, x, zi=zi * x[..., :1])
+        x = x[..., ::-1]
+    return np.moveaxis(x, -1, axis)
+
+
+def gaussian(image, sigma, method='auto'):
+    """
+    float32 Gaussian blur of image, recursive ('iir', edges extended as
+    constant), by convolution ('fir', gaussian_filter, edges reflected), or
+    recursive only where that is clearly faster, sigma >= 10 ('auto').
+    """
+    image = np.asarray(image, dtype=np.float32)
+    if method == 'fir' or sigma < 0.5 or (method == 'auto' and sigma < 10):
+        return ndimage.gaussian_filter(image, sigma)
+    for axis in range(image.ndim):
+        image = _recursive_gaussian_1d(image, sigma, axis)
+    return np.ascontiguousarray(image)
+
+
+def gaussian_scale_space(image, method='auto'):
+    """
+    Return blur(sigma) for image, caching every blur and computing new ones
+    from the largest cached smaller sigma.
+    """
+    cache = {0: np.asarray(image, dtype=np.float32)}
+
+    def blur(sigma):
+        if sigma not in cache:
+            previous = max(s for s in cache if s < sigma)
+            cache[sigma] = gaussian(cache[previous],
+                                    np.sqrt(sigma ** 2 - previous ** 2), method)
+        return cache[sigma]
+
+    return blur
+
+
+face = misc.face(gray=True)
+for sigma in (3, 5, 10, 20):
+    start = time.time()
+    expected = ndimage.gaussian_filter(face.astype(np.float32), sigma)
+    fir_time = time.time() - start
+    start = time.time()
+    blurred = gaussian(face, sigma, method='iir')
+    print('sigma %2d: gaussian_filter %.3f s, recursive %.3f s, largest difference %.2f'
+          % (sigma, fir_time, time.time() - start,
+             np.abs(blurred - expected)[20:-20, 20:-20].max()))
+
+# Sharpening and a difference of Gaussians from one scale space
+blur = gaussian_scale_space(face)
+sharpened = blur(3) + alpha * (blur(3) - blur(np.sqrt(10)))
+dog = blur(5) - blur(3)
+fig, axes = plt.subplots(1, 2)
+axes[0].imshow(sharpened, cmap=plt.cm.gray)
+axes[1].imshow(dog, cmap=plt.cm.gray)
+plt.show()
+
+# Rotation by three shears
+'''
+ndimage.rotate, used at the start of this tutorial, resamples every output pixel with a 2-D spline. For deskewing large numbers of scans there is a cheaper way: a rotation is the product of three shears (Paeth), horizontal, vertical and horizontal again, and a shear only shifts each row (or each column) as a whole. With linear interpolation, each output row is then a blend of two shifted slices of its input row, with the same two weights all along the row.
+
+rotate_shear() first takes out whole quarter turns with np.rot90, which is exact and is all that happens for multiples of 90 degrees, so that the shears only rotate by -45 to 45 degrees and stay small. The vertical shear works on the transpose, so that every pass runs along contiguous rows, and the rows are processed in bands by a pool of threads. Intermediate and output images keep the input dtype. The output grid is centred exactly as in ndimage.rotate(..., order=1), but three successive linear interpolations blur a little more than one bilinear one, so the results are not identical. Inside the image the difference is about one gray level on average, around 10 at the 99th percentile and up to about 50 at sharp edges. Along the rotated border of the image, where partly covered pixels are handled differently, it reaches about 200.
+'''
+from joblib import Parallel, delayed
+
+
+def _cast(values, dtype):
+    """
+    values in dtype, rounded and clipped for integer types.
+    """
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(values), info.min, info.max).astype(dtype)
+    return values.astype(dtype, copy=False)
+
+
+def _shift_rows(src, out, shift, start, stop):
+    """
+    out[y, x] = src[y, x - shift[y]] for rows start:stop, linearly
+    interpolated, zero outside src.
+    """
+    stop = min(stop, out.shape[0])
+    width, out_width = src.shape[1], out.shape[1]
+    # one shift per row: every row is a blend of two slices of its source
+    padded = np.zeros((stop - start, width + 2), dtype=np.float32)
+    padded[:, 1:-1] = src[start:stop]
+    band = np.zeros((stop - start, out_width), dtype=np.float32)
+    for row, s in enumerate(shift[start:stop]):
+        k = int(np.floor(s))
+        f = np.float32(s - k)
+        lo, hi = max(0, k), min(out_width, k + width + 1)
+        if lo >= hi:
+            continue
+        np.multiply(padded[row, lo - k + 1:hi - k + 1], 1 - f, out=band[row, lo:hi])
+        band[row, lo:hi] += f * padded[row, lo - k:hi - k]
+    out[start:stop] = _cast(band, out.dtype)
+
+
+def _shear(src, out_shape, shift, n_jobs, band_rows):
+    """
+    Shift every row of src by shift[row], a band of rows per thread.
+    """
+    out = np.empty(out_shape, dtype=src.dtype)
+    Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_shift_rows)(src, out, shift, start, start + band_rows)
+        for start in range(0, out_shape[0], band_rows))
+    return out
+
+
+def rotate_shear(image, angle, reshape=True, n_jobs=4, band_rows=256):
+    """
+    Rotate image by angle degrees like ndimage.rotate(image, angle, reshape,
+    order=1), with exact quarter turns and three 1-D shears, in its dtype.
+    """
+    if image.ndim == 3:
+        return np.stack([rotate_shear(image[..., c], angle, reshape, n_jobs, band_rows)
+                         for c in range(image.shape[2])], axis=-1)
+    height, width = image.shape
+    rad = np.deg2rad(angle)
+    if reshape:
+        cos, sin = abs(np.cos(rad)), abs(np.sin(rad))
+        out_shape = (int(cos * height + sin * width + 0.5),
+                     int(sin * height + cos * width + 0.5))
+    else:
+        out_shape = image.shape
+    # quarter turns are exact; the shears only rotate by -45 to 45 degrees
+    k = int(np.round(angle / 90.))
+    image = np.rot90(image, k)
+    theta = np.deg2rad(angle - 90 * k)
+    if theta == 0 and image.shape == out_shape:
+        return np.ascontiguousarray(image)
+    a, b = np.tan(theta / 2), -np.sin(theta)
+    h, w = image.shape
+    # the first shear widens the image; the second already gives the
+    # final rows, which the third only shifts
+    w1 = int(np.ceil(w + abs(a) * h)) + 2
+    y = np.arange(h) - (h - 1) / 2.
+    sheared = _shear(image, (h, w1), a * y + (w1 - w) / 2., n_jobs, band_rows)
+    # the vertical shear is a horizontal one of the transpose
+    x = np.arange(w1) - (w1 - 1) / 2.
+    sheared = _shear(np.ascontiguousarray(sheared.T), (w1, out_shape[0]),
+                     b * x + (out_shape[0] - h) / 2., n_jobs, band_rows)
+    sheared = np.ascontiguousarray(sheared.T)
+    y = np.arange(out_shape[0]) - (out_shape[0] - 1) / 2.
+    return _shear(sheared, out_shape, a * y + (out_shape[1] - w1) / 2.,
+                  n_jobs, band_rows)
+
+
+face = misc.face(gray=True)
+start = time.time()
+rotated_spline = ndimage.rotate(face, 17)
+spline_time = time.time() - start
+start = time.time()
+rotated_shear = rotate_shear(face, 17)
+print('rotate by 17 degrees: ndimage.rotate %.2f s, rotate_shear %.2f s (%s)'
+      % (spline_time, time.time() - start, rotated_shear.dtype))
+difference = np.abs(rotated_shear.astype(float) - ndimage.rotate(face, 17, order=1))
+inside = ndimage.binary_erosion(ndimage.rotate(np.ones(face.shape), 17, order=0) > 0,
+                                iterations=3)
+print('difference to order=1 inside the image: mean %.2f, 99th percentile %.0f, '
+      'largest %.0f; on the border up to %.0f'
+      % (difference[inside].mean(), np.percentile(difference[inside], 99),
+         difference[inside].max(), difference[~inside].max()))
+print('quarter turn exact:', np.array_equal(rotate_shear(face, 90), ndimage.rotate(face, 90)))
+plt.imshow(rotated_shear, cmap=plt.cm.gray)
+plt.show()
@@ -31,3 +31,122 @@ ax2.axis('off')
 ax2.imshow(hog_image_rescaled, cmap=plt.cm.gray)
 ax2.set_title('Histogram of Oriented Gradients')
 plt.show()
+
+# HOG feature maps for sliding-window detection
+'''
+hog() returns one descriptor for the whole image. A sliding-window detector needs a descriptor for every window, and calling hog() on each window recomputes the gradients and cell histograms of the pixels that overlapping windows share many times over.
+
+The block-normalized descriptor of a window is just the window's part of the image's block grid: the cell histograms and their block normalization do not depend on where the window is. So we compute the cell histograms and normalized blocks once per pyramid level, and a window's descriptor is a slice of that grid; all windows at a given stride come out of one view_as_windows as an (n_windows, n_features) matrix. The only difference from hog() on the cropped window is at the window border, where the feature map uses the true image gradient and hog() assumes zero, which is also how HOG detectors are usually run.
+'''
+import time
+import numpy as np
+from skimage.util import view_as_windows
+from skimage.transform import pyramid_gaussian
+
+
+def hog_cells(image, orientations=8, pixels_per_cell=(16, 16)):
+    """
+    Cell histograms of image as an (n_cells_row, n_cells_col, orientations)
+    array, the same as hog() computes before block normalization.
+    """
+    image = np.asarray(image, dtype=np.float64)
+    g_row = np.zeros_like(image)
+    g_col = np.zeros_like(image)
+    g_row[1:-1, :] = image[2:, :] - image[:-2, :]
+    g_col[:, 1:-1] = image[:, 2:] - image[:, :-2]
+    c_row, c_col = pixels_per_cell
+    n_cells_row = image.shape[0] // c_row
+    n_cells_col = image.shape[1] // c_col
+    g_row = g_row[:n_cells_row * c_row, :n_cells_col * c_col]
+    g_col = g_col[:n_cells_row * c_row, :n_cells_col * c_col]
+    magnitude = np.hypot(g_col, g_row)
+    orientation = np.rad2deg(np.arctan2(g_row, g_col)) % 180
+    # same bin edges, and the same [start, end) test, as hog()
+    edges = 180. / orientations * np.arange(1, orientations)
+    bins = np.digitize(orientation, edges)
+    cell = ((np.arange(magnitude.shape[0]) // c_row)[:, np.newaxis] * n_cells_col +
+            np.arange(magnitude.shape[1]) // c_col)
+    hist = np.bincount((cell * orientations + bins).ravel(),
+                       weights=magnitude.ravel(),
+                       minlength=n_cells_row * n_cells_col * orientations)
+    return hist.reshape(n_cells_row, n_cells_col, orientations) / (c_row * c_col)
+
+
+def hog_blocks(cells, cells_per_block=(1, 1), block_norm='L1', eps=1e-5):
+    """
+    Normalized blocks of a cell grid, shaped (n_blocks_row, n_blocks_col,
+    b_row, b_col, orientations) like hog(..., feature_vector=False).
+    """
+    b_row, b_col = cells_per_block
+    blocks = view_as_windows(cells, (b_row, b_col, cells.shape[2]))[:, :, 0]
+    if block_norm == 'L1':
+        return blocks / (np.abs(blocks).sum(axis=(2, 3, 4), keepdims=True) + eps)
+    if block_norm == 'L1-sqrt':
+        return np.sqrt(blocks / (np.abs(blocks).sum(axis=(2, 3, 4),
+                                                    keepdims=True) + eps))
+    norm = np.sqrt((blocks ** 2).sum(axis=(2, 3, 4), keepdims=True) + eps ** 2)
+    if block_norm == 'L2':
+        return blocks / norm
+    if block_norm == 'L2-Hys':
+        out = np.minimum(blocks / norm, 0.2)
+        return out / np.sqrt((out ** 2).sum(axis=(2, 3, 4), keepdims=True) + eps ** 2)
+    raise ValueError('Selected block normalization method is invalid.')
+
+
+def hog_pyramid(image, window_shape, downscale=1.25, orientations=8,
+                pixels_per_cell=(16, 16), cells_per_block=(1, 1),
+                block_norm='L1'):
+    """
+    Return [(scale, blocks), ...] for every level of a Gaussian pyramid
+    that is still at least window_shape.
+    """
+    levels = []
+    for level in pyramid_gaussian(image, downscale=downscale):
+        if level.shape[0] < window_shape[0] or level.shape[1] < window_shape[1]:
+            break
+        cells = hog_cells(level, orientations, pixels_per_cell)
+        levels.append((image.shape[0] / float(level.shape[0]),
+                       hog_blocks(cells, cells_per_block, block_norm)))
+    return levels
+
+
+def hog_windows(blocks, window_cells, cells_per_block=(1, 1), step=1):
+    """
+    Descriptors of all windows of window_cells cells, every step cells.
+    Returns the (row, col) cell position of each window and an
+    (n_windows, n_features) matrix.
+    """
+    n_blocks = (window_cells[0] - cells_per_block[0] + 1,
+                window_cells[1] - cells_per_block[1] + 1)
+    windows = view_as_windows(blocks, n_blocks + blocks.shape[2:], step=step)
+    n_row, n_col = windows.shape[:2]
+    rows, cols = np.mgrid[:n_row, :n_col] * step
+    positions = np.column_stack([rows.ravel(), cols.ravel()])
+    return positions, windows.reshape(n_row * n_col, -1)
+
+
+# The feature map of the whole image gives back hog()'s descriptor ...
+blocks = hog_blocks(hog_cells(image, 8, (16, 16)), (1, 1))
+print('Same descriptor as hog():', np.allclose(blocks.ravel(), fd))
+
+# ... and every 128 x 64 window, at every scale, comes out of it
+window_shape, pixels_per_cell = (128, 64), (16, 16)
+window_cells = (window_shape[0] // pixels_per_cell[0],
+                window_shape[1] // pixels_per_cell[1])
+start = time.time()
+n_windows = 0
+for scale, level_blocks in hog_pyramid(image, window_shape):
+    positions, descriptors = hog_windows(level_blocks, window_cells)
+    n_windows += len(descriptors)
+print('%d window descriptors from the feature maps: %.2f s'
+      % (n_windows, time.time() - start))
+
+start = time.time()
+step_px = pixels_per_cell[0]
+for row in range(0, image.shape[0] - window_shape[0] + 1, step_px):
+    for col in range(0, image.shape[1] - window_shape[1] + 1, step_px):
+        hog(image[row:row + window_shape[0], col:col + window_shape[1]],
+            orientations=8, pixels_per_cell=pixels_per_cell,
+            cells_per_block=(1, 1))
+print('hog() on every window of the first level only: %.2f s'
+      % (time.time() - start))
@@ -51,4 +51,248 @@ for idx, (blobs, color, title) in enumerate(sequence):
     ax[idx].set_axis_off()
 
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Streaming scale space
+'''
+blob_log() and blob_dog() first build the whole (rows, cols, num_sigma) float64 cube of filter responses and only then look for local maxima in it; each Gaussian is also computed from scratch at its full sigma. On large tiles the cube alone exhausts memory. Two observations remove the cube:
+
+1.) A point is a local maximum of the cube if it is the maximum of its 3x3 neighborhood in its own scale and the two scales next to it. So the scales can be produced one at a time, keeping only a rolling window of three response slices (and their 3x3 maximum filters), reporting the maxima of the middle slice whenever a new slice arrives.
+2.) Blurring with sigma_1 and then with sqrt(sigma_2**2 - sigma_1**2) is the same as blurring with sigma_2. Every Gaussian can therefore be computed from the previous one with a small increment, whose kernel is much shorter than that of sigma_2 itself.
+
+Everything is kept in float32, so memory is a handful of image-sized float32 slices regardless of num_sigma. For LoG each level is the gaussian_laplace() of the previous level's Gaussian with the sigma increment, which by 2.) is the Laplacian of Gaussian of the image itself, as in blob_log(). Overlapping blobs are pruned as in skimage.
+'''
+from collections import deque
+from itertools import chain
+import time
+import numpy as np
+from scipy import ndimage as ndi
+from scipy.spatial import cKDTree
+
+
+def _cascaded_gaussians(image, sigma_list):
+    """
+    Yield image blurred with each sigma in turn, each from the previous one.
+    """
+    blurred = ndi.gaussian_filter(image, sigma_list[0], output=np.float32)
+    yield blurred
+    for previous, sigma in zip(sigma_list[:-1], sigma_list[1:]):
+        blurred = ndi.gaussian_filter(blurred, np.sqrt(sigma**2 - previous**2))
+        yield blurred
+
+
+def _stream_peaks(responses, threshold):
+    """
+    (row, col, scale index) of the 3x3x3 local maxima above threshold in a
+    stream of 2D response slices, holding three slices at a time.
+    """
+    window = deque(maxlen=3)
+    peaks = []
+
+    def find(center, neighbors, index):
+        local_max = center[1].copy()
+        for neighbor in neighbors:
+            np.maximum(local_max, neighbor[1], out=local_max)
+        rows, cols = np.nonzero((center[0] == local_max) &
+                                (center[0] > threshold))
+        peaks.append(np.column_stack([rows, cols, np.full(len(rows), index)]))
+
+    for k, response in enumerate(responses):
+        window.append((response,
+                       ndi.maximum_filter(response, size=3, mode='nearest')))
+        if k >= 1:
+            find(window[-2], [window[0], window[-1]] if k >= 2 else
+                 [window[-1]], k - 1)
+    find(window[-1], [window[-2]] if k >= 1 else [], k)
+    return np.concatenate(peaks)
+
+
+def _circle_overlap(r1, r2, d):
+    """
+    Fraction of the smaller of two circles covered by the other.
+    """
+    if d >= r1 + r2:
+        return 0.
+    if d <= abs(r1 - r2):
+        return 1.
+    a = r1**2 * np.arccos((d**2 + r1**2 - r2**2) / (2 * d * r1))
+    b = r2**2 * np.arccos((d**2 + r2**2 - r1**2) / (2 * d * r2))
+    c = 0.5 * np.sqrt((-d + r1 + r2) * (d + r1 - r2) *
+                      (d - r1 + r2) * (d + r1 + r2))
+    return (a + b - c) / (np.pi * min(r1, r2)**2)
+
+
+def prune_blobs(blobs, overlap):
+    """
+    Drop the smaller blob of each pair overlapping by more than overlap.
+    blobs are (row, col, sigma) rows.
+    """
+    if len(blobs) == 0:
+        return blobs
+    radii = blobs[:, 2] * sqrt(2)
+    alive = np.ones(len(blobs), dtype=bool)
+    tree = cKDTree(blobs[:, :2])
+    for i, j in tree.query_pairs(2 * radii.max()):
+        if not (alive[i] and alive[j]):
+            continue
+        d = np.hypot(*(blobs[i, :2] - blobs[j, :2]))
+        if _circle_overlap(radii[i], radii[j], d) > overlap:
+            alive[j if radii[i] > radii[j] else i] = False
+    return blobs[alive]
+
+
+def blob_log_stream(image, min_sigma=1, max_sigma=50, num_sigma=10,
+                    threshold=.2, overlap=.5):
+    """
+    blob_log() with a rolling three-slice scale space.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    sigma_list = np.linspace(min_sigma, max_sigma, num_sigma)
+    # each level is the Laplacian of Gaussian of the previous blur, with
+    # the increment that takes it to sigma
+    previous = chain([image], _cascaded_gaussians(image, sigma_list[:-1]))
+    responses = (ndi.gaussian_laplace(g, np.sqrt(sigma**2 - prev_sigma**2))
+                 * np.float32(-sigma**2) for sigma, prev_sigma, g in
+                 zip(sigma_list, np.r_[0, sigma_list[:-1]], previous))
+    peaks = _stream_peaks(responses, threshold)
+    blobs = np.column_stack([peaks[:, :2], sigma_list[peaks[:, 2]]])
+    return prune_blobs(blobs.astype(np.float64), overlap)
+
+
+def blob_dog_stream(image, min_sigma=1, max_sigma=50, sigma_ratio=1.6,
+                    threshold=2.0, overlap=.5):
+    """
+    blob_dog() with a rolling three-slice scale space.
+    """
+    image = np.asarray(image, dtype=np.float32)
+    k = int(np.log(float(max_sigma) / min_sigma) / np.log(sigma_ratio) + 1)
+    sigma_list = min_sigma * sigma_ratio ** np.arange(k + 1)
+
+    def responses():
+        gaussians = _cascaded_gaussians(image, sigma_list)
+        previous = next(gaussians)
+        for sigma, current in zip(sigma_list, gaussians):
+            yield (previous - current) * np.float32(sigma)
+            previous = current
+
+    peaks = _stream_peaks(responses(), threshold)
+    blobs = np.column_stack([peaks[:, :2], sigma_list[peaks[:, 2]]])
+    return prune_blobs(blobs.astype(np.float64), overlap)
+
+
+start = time.time()
+blobs_log_stream = blob_log_stream(image_gray, max_sigma=30, num_sigma=10,
+                                   threshold=.1)
+print('LoG: %d blobs, streaming %d blobs in %.2f s'
+      % (len(blobs_log), len(blobs_log_stream), time.time() - start))
+start = time.time()
+blobs_dog_stream = blob_dog_stream(image_gray, max_sigma=30, threshold=.1)
+print('DoG: %d blobs, streaming %d blobs in %.2f s'
+      % (len(blobs_dog), len(blobs_dog_stream), time.time() - start))
+
+# Tiled blob detection on the full field
+'''
+The detectors above are run on a 500 x 500 crop because the full Hubble deep field is too slow (and, for LoG and DoG, too large) to process in one go. Blob detection is local, though: whether a pixel is a blob center only depends on the image within a few max_sigma of it. The image can therefore be cut into tiles, each padded with a halo wide enough that its filter responses are exactly those of the full image:
+
+* LoG: the Gaussian kernel at max_sigma reaches 4 * max_sigma pixels
+* DoG: the same for the largest sigma actually used, which can be up to sigma_ratio * max_sigma
+* DoH: the box filters reach about 1.5 * max_sigma, and are computed from one integral image of the whole field that every tile shares
+
+plus one pixel for the 3x3 neighborhood of the maxima search. The tiles run in a process pool (joblib passes large arrays such as the integral image to the workers as shared memory maps). Each tile keeps only the blobs whose center lies in its own core, so blobs seen in two overlapping halos are not reported twice, and overlapping blobs are finally pruned over the whole image, giving one (N, 3) array with the same blobs as a single run.
+'''
+from joblib import Parallel, delayed
+from skimage.transform import integral_image
+# the box-filter Hessian blob_doh() itself applies to an integral image
+from skimage.feature._hessian_det_appx import _hessian_matrix_det
+
+
+def _blob_halo(method, min_sigma=1, max_sigma=50, sigma_ratio=1.6, **kwargs):
+    if method == 'log':
+        return int(4 * max_sigma + 0.5) + 1
+    if method == 'dog':
+        k = int(np.log(float(max_sigma) / min_sigma) / np.log(sigma_ratio) + 1)
+        return int(4 * min_sigma * sigma_ratio ** k + 0.5) + 1
+    if method == 'doh':
+        return int(3 * max_sigma) + 2
+    raise ValueError('Unknown blob detection method: %s' % method)
+
+
+def _doh_tile(integral, r0, r1, c0, c1, min_sigma=1, max_sigma=30,
+              num_sigma=10, threshold=0.01):
+    """
+    blob_doh() peaks of image[r0:r1, c0:c1], from the shared integral image.
+    """
+    # integral image of the tile alone, cut out of the global one
+    tile = np.array(integral[r0:r1, c0:c1], dtype=np.float64)
+    if r0 > 0:
+        tile -= integral[r0 - 1, c0:c1]
+    if c0 > 0:
+        tile -= integral[r0:r1, c0 - 1][:, np.newaxis]
+    if r0 > 0 and c0 > 0:
+        tile += integral[r0 - 1, c0 - 1]
+    sigma_list = np.linspace(min_sigma, max_sigma, num_sigma)
+    responses = (np.asarray(_hessian_matrix_det(tile, s)) for s in sigma_list)
+    peaks = _stream_peaks(responses, threshold)
+    return np.column_stack([peaks[:, :2], sigma_list[peaks[:, 2]]])
+
+
+def _blob_tile(method, source, r0, r1, c0, c1, core, kwargs):
+    if method == 'doh':
+        blobs = _doh_tile(source, r0, r1, c0, c1, **kwargs)
+    else:
+        detector = blob_log if method == 'log' else blob_dog
+        # overlap=1 disables pruning; it is done once over the whole image
+        blobs = detector(np.asarray(source[r0:r1, c0:c1]), overlap=1, **kwargs)
+    blobs = np.asarray(blobs, dtype=np.float64).reshape(-1, 3)
+    blobs[:, 0] += r0
+    blobs[:, 1] += c0
+    (cr0, cr1), (cc0, cc1) = core
+    mine = ((blobs[:, 0] >= cr0) & (blobs[:, 0] < cr1) &
+            (blobs[:, 1] >= cc0) & (blobs[:, 1] < cc1))
+    return blobs[mine]
+
+
+def blob_tiled(image, method='log', tile_size=512, overlap=.5, n_jobs=4,
+               **kwargs):
+    """
+    Run blob_log, blob_dog or blob_doh (method 'log', 'dog' or 'doh') tile
+    by tile with a halo sized from max_sigma. Returns the (N, 3) blobs of
+    the whole image.
+    """
+    image = np.asarray(image, dtype=np.float64)
+    height, width = image.shape
+    halo = _blob_halo(method, **kwargs)
+    source = integral_image(image) if method == 'doh' else image
+    tasks = []
+    for cr0 in range(0, height, tile_size):
+        for cc0 in range(0, width, tile_size):
+            cr1, cc1 = min(cr0 + tile_size, height), min(cc0 + tile_size, width)
+            r0, c0 = max(cr0 - halo, 0), max(cc0 - halo, 0)
+            r1, c1 = min(cr1 + halo, height), min(cc1 + halo, width)
+            tasks.append(delayed(_blob_tile)(method, source, r0, r1, c0, c1,
+                                             ((cr0, cr1), (cc0, cc1)), kwargs))
+    blobs = np.concatenate(Parallel(n_jobs=n_jobs)(tasks))
+    return prune_blobs(blobs, overlap)
+
+
+# Same blobs as a single run on the crop ...
+blobs_doh_tiled = blob_tiled(image_gray, 'doh', tile_size=128, max_sigma=30,
+                             threshold=.01)
+print('DoH: %d blobs, tiled %d blobs' % (len(blobs_doh), len(blobs_doh_tiled)))
+
+# ... and the full deep field, which is too slow to do in one piece
+image_full = data.hubble_deep_field()
+image_full_gray = rgb2gray(image_full)
+start = time.time()
+blobs_full = blob_tiled(image_full_gray, 'log', max_sigma=30, num_sigma=10,
+                        threshold=.1)
+blobs_full[:, 2] = blobs_full[:, 2] * sqrt(2)
+print('Full field LoG: %d blobs in %.1f s' % (len(blobs_full), time.time() - start))
+
+fig, ax = plt.subplots(figsize=(9, 9))
+ax.imshow(image_full, interpolation='nearest')
+for y, x, r in blobs_full:
+    ax.add_patch(plt.Circle((x, y), r, color='yellow', linewidth=1, fill=False))
+ax.set_axis_off()
+plt.tight_layout()
+plt.show()
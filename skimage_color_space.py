@@ -17,4 +17,118 @@ axes[0].set_title('RGB')
 axes[1].imshow(color.rgb2hsv(image_ironchef))
 axes[1].axis('off')
 axes[1].set_title('HSV')
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Colour conversions in uint8
+'''
+rgb2gray, rgb2hsv, rgb2ycbcr and rgb2lab first convert a uint8 image to float64, eight times its size, and then allocate several more float64 arrays of the same size on the way. On a 50 megapixel photo that is gigabytes for a conversion whose input and output fit in 150 MB each.
+
+convert_color() below reads the uint8 image a band of rows at a time and writes uint8 (or float32) output, so apart from input and output it only holds a few float32 arrays the size of a band. Bands are converted in a pool of threads.
+
+* gray and YCbCr are linear in R, G and B: one float32 matrix product per band (faster than summing three lookups in per-channel tables)
+* Lab goes through linear RGB, whose power law is replaced by a 256-entry lookup table; the rest (3 x 3 matrix to XYZ, cube root) is computed in float32
+* HSV is computed directly from the band in float32: a 3-D lookup table with interpolation would smear the hue where it wraps around from red back to red
+
+With dtype=np.float32 the output has the same units as the skimage function. With dtype=np.uint8 it is scaled to 0-255 and rounded half up: gray, H, S and V by 255, YCbCr as is, and Lab as L * 255 / 100, a + 128, b + 128 (the convention OpenCV uses for 8-bit Lab).
+'''
+import time
+import tracemalloc
+import numpy as np
+from joblib import Parallel, delayed
+from skimage.color.colorconv import ycbcr_from_rgb, xyz_from_rgb
+
+_lab_white = np.array([0.95047, 1., 1.08883])  # D65, 2 degree observer
+# (matrix applied to uint8 RGB, offset) of the linear conversions
+_linear_conversions = {
+    'gray': (np.array([[0.2125], [0.7154], [0.0721]], dtype=np.float32) / 255,
+             np.float32(0)),
+    'ycbcr': ((ycbcr_from_rgb.T / 255).astype(np.float32),
+              np.array([16, 128, 128], dtype=np.float32)),
+}
+_srgb = np.arange(256) / 255.
+_linear_rgb = np.where(_srgb > 0.04045, ((_srgb + 0.055) / 1.055) ** 2.4,
+                       _srgb / 12.92).astype(np.float32)
+# (scale, offset) to uint8; the offsets include the 0.5 for rounding
+_uint8_scale = {
+    'gray': (np.float32(255), np.float32(0.5)),
+    'hsv': (np.float32(255), np.float32(0.5)),
+    'ycbcr': (np.float32(1), np.float32(0.5)),
+    'lab': (np.array([2.55, 1, 1], dtype=np.float32),
+            np.array([0.5, 128.5, 128.5], dtype=np.float32)),
+}
+
+
+def _hsv_band(rgb):
+    rgb = rgb.astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    v = rgb.max(axis=-1)
+    delta = v - rgb.min(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(delta == 0, 0, delta / v)
+        # the same precedence as rgb2hsv: red, then green, then blue is max
+        h = np.select([r == v, g == v],
+                      [(g - b) / delta, 2 + (b - r) / delta],
+                      4 + (r - g) / delta)
+    h = (h / 6) % 1
+    h[delta == 0] = 0
+    return np.stack([h, s, v / 255], axis=-1)
+
+
+def _lab_band(rgb):
+    xyz = np.take(_linear_rgb, rgb) @ (xyz_from_rgb.T / _lab_white).astype(np.float32)
+    xyz = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16. / 116)
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    return np.stack([116 * y - 16, 500 * (x - y), 200 * (y - z)], axis=-1)
+
+
+def _convert_band(rgb, space, out):
+    if space in _linear_conversions:
+        matrix, offset = _linear_conversions[space]
+        values = rgb.astype(np.float32) @ matrix + offset
+    elif space == 'hsv':
+        values = _hsv_band(rgb)
+    else:
+        values = _lab_band(rgb)
+    if out.dtype == np.uint8:
+        # in place: these passes cost as much as the conversion itself
+        scale, offset = _uint8_scale[space]
+        values *= scale
+        values += offset
+        np.clip(values, 0, 255, out=values)
+    out[...] = values.reshape(out.shape)
+
+
+def convert_color(image, space, dtype=np.uint8, band_rows=64, n_jobs=4):
+    """
+    Convert a uint8 RGB image to space ('gray', 'hsv', 'ycbcr' or 'lab')
+    a band of rows at a time, returning uint8 or float32.
+    """
+    n_channels = 1 if space == 'gray' else 3
+    out = np.empty(image.shape[:2] + ((n_channels,) if n_channels > 1 else ()),
+                   dtype=dtype)
+    Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_convert_band)(image[start:start + band_rows], space,
+                               out[start:start + band_rows])
+        for start in range(0, image.shape[0], band_rows))
+    return out
+
+
+# The same conversions, in float32 and in a fraction of the memory
+conversions = [('gray', color.rgb2gray), ('hsv', color.rgb2hsv),
+               ('ycbcr', color.rgb2ycbcr), ('lab', color.rgb2lab)]
+for space, skimage_conversion in conversions:
+    tracemalloc.start()
+    start = time.time()
+    expected = skimage_conversion(image_ironchef)
+    skimage_time = time.time() - start
+    skimage_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    tracemalloc.start()
+    start = time.time()
+    converted = convert_color(image_ironchef, space, dtype=np.float32)
+    lut_time = time.time() - start
+    lut_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('%-5s largest difference %.2g, %.3f s and %.1f MB (skimage %.3f s and %.1f MB)'
+          % (space, np.abs(converted - expected).max(), lut_time, lut_peak / 2**20,
+             skimage_time, skimage_peak / 2**20))
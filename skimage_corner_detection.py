@@ -25,4 +25,118 @@ ax.imshow(image, interpolation='nearest', cmap=plt.cm.gray)
 ax.plot(coords[:, 1], coords[:, 0], 'xb', markersize=15)
 ax.plot(coords_subpix[:, 1], coords_subpix[:, 0], '+r', markersize=15)
 ax.axis((0, 350, 350, 0))
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Harris corners at video rates
+'''
+corner_harris, corner_peaks and corner_subpix each start again from the image: corner_subpix recomputes the image derivatives in a window around every corner, and loops over the corners in Python, which is the slowest part once there are thousands of corners per frame.
+
+Both steps use the same Sobel derivatives, so harris_corners() below computes them once, in float32, on the image padded by half the subpixel window. The Harris response is the Gaussian-smoothed structure tensor of the image part, corners are the local maxima of the response above a threshold (maximum filter non-maximum suppression, as corner_peaks), and the subpixel positions of all corners come from stacking their windows of the derivative products into (n_corners, window_size, window_size) arrays. corner_subpix solves two 2 x 2 normal equations per corner (corner as a dot and as the intersection of edges) and keeps the model the F-test prefers; here both are solved in closed form for all corners at once.
+'''
+import time
+import numpy as np
+from scipy import ndimage as ndi
+from scipy import stats
+from scipy.spatial import cKDTree
+
+
+def _suppress_plateaus(coords, min_distance):
+    """
+    Keep only the first (in raster order) of maxima closer than min_distance,
+    as corner_peaks does for flat maxima.
+    """
+    keep = np.ones(len(coords), dtype=bool)
+    pairs = cKDTree(coords).query_pairs(min_distance, p=np.inf, output_type='ndarray')
+    for i, j in pairs[np.lexsort(pairs.T[::-1])]:
+        if keep[i]:
+            keep[j] = False
+    return coords[keep]
+
+
+def harris_corners(image, sigma=1, k=0.05, min_distance=5, threshold_rel=0.1,
+                   window_size=13, alpha=0.99):
+    """
+    Return the Harris corners of image and their subpixel positions (NaN
+    where the corner is neither a dot nor an edge corner).
+    """
+    wext = (window_size - 1) // 2
+    padded = np.pad(np.asarray(image, dtype=np.float32), wext, mode='constant')
+    g_row = ndi.sobel(padded, axis=0, mode='constant')
+    g_col = ndi.sobel(padded, axis=1, mode='constant')
+    xx, xy, yy = g_col * g_col, g_col * g_row, g_row * g_row
+
+    # Harris response from the image part of the derivative products
+    inner = (slice(wext, padded.shape[0] - wext), slice(wext, padded.shape[1] - wext))
+    Axx = ndi.gaussian_filter(xx[inner], sigma, mode='constant')
+    Axy = ndi.gaussian_filter(xy[inner], sigma, mode='constant')
+    Ayy = ndi.gaussian_filter(yy[inner], sigma, mode='constant')
+    response = (Axx * Ayy - Axy ** 2) - k * (Axx + Ayy) ** 2
+
+    # non-maximum suppression
+    size = 2 * min_distance + 1
+    peaks = response == ndi.maximum_filter(response, size=size, mode='constant')
+    peaks &= response > max(threshold_rel * response.max(), response.min())
+    if min_distance > 0:
+        peaks[:min_distance] = peaks[-min_distance:] = False
+        peaks[:, :min_distance] = peaks[:, -min_distance:] = False
+    coords = _suppress_plateaus(np.argwhere(peaks), min_distance)
+
+    # windows of the derivative products around every corner
+    y, x = np.mgrid[-wext:wext + 1, -wext:wext + 1]
+    rows = coords[:, 0, np.newaxis, np.newaxis] + wext + y
+    cols = coords[:, 1, np.newaxis, np.newaxis] + wext + x
+    wxx, wxy, wyy = xx[rows, cols], xy[rows, cols], yy[rows, cols]
+
+    def window_sum(a):
+        return a.sum(axis=(1, 2), dtype=np.float64)
+
+    Axx, Axy, Ayy = window_sum(wxx), window_sum(wxy), window_sum(wyy)
+    bxx_x, bxx_y = window_sum(wxx * x), window_sum(wxx * y)
+    bxy_x, bxy_y = window_sum(wxy * x), window_sum(wxy * y)
+    byy_x, byy_y = window_sum(wyy * x), window_sum(wyy * y)
+
+    # normal equations of both corner models, solved for all corners
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_det = 1. / (Axx * Ayy - Axy ** 2)
+        b0, b1 = bxx_y - bxy_x, byy_x - bxy_y
+        dot = np.column_stack([(Ayy * b0 + Axy * b1) * inv_det,
+                               (Axx * b1 + Axy * b0) * inv_det])
+        b0, b1 = byy_y + bxy_x, bxx_x + bxy_y
+        edge = np.column_stack([(Axx * b0 - Axy * b1) * inv_det,
+                                (Ayy * b1 - Axy * b0) * inv_det])
+
+    def variance(est, w_ryy, w_rxx, sign):
+        ry = y - est[:, 0, np.newaxis, np.newaxis]
+        rx = x - est[:, 1, np.newaxis, np.newaxis]
+        return window_sum(w_ryy * ry * ry + sign * 2 * wxy * rx * ry + w_rxx * rx * rx)
+
+    var_dot = variance(dot, wxx, wyy, -1)
+    var_edge = variance(edge, wyy, wxx, 1)
+
+    # F-test between the two models: -1 dot, 1 edge, 0 not classified
+    redundancy = window_size ** 2 - 2
+    t_crit_dot = stats.f.isf(1 - alpha, redundancy, redundancy)
+    t_crit_edge = stats.f.isf(alpha, redundancy, redundancy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = var_edge / var_dot
+    t[(var_dot < np.spacing(1)) & (var_edge < np.spacing(1))] = np.nan
+    corner_class = (t < t_crit_edge).astype(int) - (t > t_crit_dot)
+    subpix = np.where(corner_class[:, np.newaxis] == -1, dot, edge) + coords
+    subpix[corner_class == 0] = np.nan
+    return coords, subpix
+
+
+coords_fused, subpix_fused = harris_corners(image, min_distance=5, window_size=13)
+print('%d corners (%d with corner_peaks), largest subpixel difference %.3g'
+      % (len(coords_fused), len(coords),
+         np.nanmax(np.abs(subpix_fused - coords_subpix))))
+
+# a larger frame with thousands of corners
+frame = np.tile(image, (4, 4))
+start = time.time()
+coords_frame = corner_peaks(corner_harris(frame), min_distance=5)
+corner_subpix(frame, coords_frame, window_size=13)
+print('corner_harris + corner_peaks + corner_subpix: %.3f s' % (time.time() - start))
+start = time.time()
+harris_corners(frame, min_distance=5, window_size=13)
+print('harris_corners: %.3f s' % (time.time() - start))
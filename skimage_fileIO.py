@@ -45,4 +45,276 @@ axes[2].imshow(util.invert(image2_grey), cmap=plt.cm.gray)
 axes[2].axis('off')
 axes[2].set_title('GrayScale - Inverted')
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Chunked, compressed, multi-resolution storage
+'''
+A JPEG or PNG file has to be decoded completely before any part of it can be used, and the raw dumps in scipy_image_tutorial.py are not compressed at all. Viewers and tile-based algorithms on large images need something else: read only the region they work on, at the resolution they need.
+
+write_chunked() stores an image in a directory in the spirit of zarr: the image is cut into fixed-size chunks, every chunk is compressed (zlib) into its own file, and downsampled copies (2 x 2 averages, down to a single chunk) are stored the same way, one subdirectory per level, described by meta.json. Chunks are compressed and written in a pool of threads (zlib releases the GIL). open_chunked() returns one lazy ChunkedArray per level: indexing it like a numpy array reads, in parallel, and decompresses only the chunks the selection touches.
+'''
+import json
+import time
+import zlib
+import numpy as np
+from joblib import Parallel, delayed
+
+
+def _write_chunk(path, block, compresslevel):
+    # write then rename, so a reader never sees half a chunk
+    with open(path + '.tmp', 'wb') as f:
+        f.write(zlib.compress(np.ascontiguousarray(block).tobytes(), compresslevel))
+    os.replace(path + '.tmp', path)
+
+
+def _downsample(image):
+    """
+    2 x 2 average of image (an odd last row or column is dropped).
+    """
+    h, w = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    blocks = image[:h, :w].reshape((h // 2, 2, w // 2, 2) + image.shape[2:])
+    mean = blocks.mean(axis=(1, 3), dtype=np.float32)
+    if np.issubdtype(image.dtype, np.integer):
+        mean = np.rint(mean)
+    return mean.astype(image.dtype)
+
+
+def _as_range(index, size):
+    """
+    (start, stop, step, is_int) of an int or slice index along an axis.
+    """
+    if isinstance(index, slice):
+        return index.indices(size) + (False,)
+    index = int(index)
+    if index < 0:
+        index += size
+    if not 0 <= index < size:
+        raise IndexError('index %d is out of bounds for axis with size %d' % (index, size))
+    return index, index + 1, 1, True
+
+
+class ChunkedArray(object):
+    """
+    Lazy view of one level of a chunked image: indexing reads and
+    decompresses only the chunks the selection touches.
+    """
+
+    def __init__(self, path, shape, dtype, chunks, n_jobs=4):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = tuple(chunks)
+        self.ndim = len(self.shape)
+        self.n_jobs = n_jobs
+
+    def _read_chunk(self, i, j):
+        with open(os.path.join(self.path, '%d.%d' % (i, j)), 'rb') as f:
+            data = zlib.decompress(f.read())
+        h = min(self.chunks[0], self.shape[0] - i * self.chunks[0])
+        w = min(self.chunks[1], self.shape[1] - j * self.chunks[1])
+        return np.frombuffer(data, dtype=self.dtype).reshape((h, w) + self.shape[2:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (self.ndim - len(key))
+        r0, r1, r_step, r_int = _as_range(key[0], self.shape[0])
+        c0, c1, c_step, c_int = _as_range(key[1], self.shape[1])
+        # read the bounding box of the selection, then apply steps
+        if r_step < 0:
+            r0, r1 = r1 + 1, r0 + 1
+        if c_step < 0:
+            c0, c1 = c1 + 1, c0 + 1
+        out = np.zeros((max(r1 - r0, 0), max(c1 - c0, 0)) + self.shape[2:], dtype=self.dtype)
+        ch, cw = self.chunks
+        tiles = [(i, j) for i in range(r0 // ch, (r1 - 1) // ch + 1)
+                 for j in range(c0 // cw, (c1 - 1) // cw + 1)] if out.size else []
+        if len(tiles) > 1:
+            blocks = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+                delayed(self._read_chunk)(i, j) for i, j in tiles)
+        else:
+            blocks = [self._read_chunk(i, j) for i, j in tiles]
+        for (i, j), block in zip(tiles, blocks):
+            top, left = i * ch, j * cw
+            a, b = max(r0, top), min(r1, top + block.shape[0])
+            c, d = max(c0, left), min(c1, left + block.shape[1])
+            out[a - r0:b - r0, c - c0:d - c0] = block[a - top:b - top, c - left:d - left]
+        out = out[::r_step, ::c_step][(slice(None), slice(None)) + key[2:]]
+        if r_int and c_int:
+            return out[0, 0]
+        if r_int:
+            return out[0]
+        if c_int:
+            return out[:, 0]
+        return out
+
+    def __array__(self, dtype=None):
+        return np.asarray(self[:, :], dtype=dtype)
+
+
+def write_chunked(path, image, chunks=(256, 256), compresslevel=1, n_jobs=4):
+    """
+    Store image and its 2 x 2 pyramid as compressed chunks in the directory
+    path, and return the levels as ChunkedArrays.
+    """
+    levels = []
+    with Parallel(n_jobs=n_jobs, prefer='threads') as parallel:
+        while True:
+            level_path = os.path.join(path, str(len(levels)))
+            os.makedirs(level_path, exist_ok=True)
+            parallel(delayed(_write_chunk)(
+                os.path.join(level_path, '%d.%d' % (r // chunks[0], c // chunks[1])),
+                image[r:r + chunks[0], c:c + chunks[1]], compresslevel)
+                for r in range(0, image.shape[0], chunks[0])
+                for c in range(0, image.shape[1], chunks[1]))
+            levels.append(list(image.shape))
+            if (image.shape[0] <= chunks[0] and image.shape[1] <= chunks[1]) or min(image.shape[:2]) < 2:
+                break
+            image = _downsample(image)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(dict(dtype=image.dtype.str, chunks=list(chunks), levels=levels,
+                       compression='zlib'), f, indent=1)
+    return open_chunked(path, n_jobs)
+
+
+def open_chunked(path, n_jobs=4):
+    """
+    ChunkedArrays of all levels of an image stored by write_chunked().
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    return [ChunkedArray(os.path.join(path, str(level)), shape, meta['dtype'],
+                         meta['chunks'], n_jobs)
+            for level, shape in enumerate(meta['levels'])]
+
+
+output_dir = 'output'
+
+# A large image, stored once ...
+large = np.tile(image_ironchef, (8, 8, 1))
+start = time.time()
+levels = write_chunked(os.path.join(output_dir, 'ironchef_chunked'), large)
+print('wrote %d levels in %.2f s' % (len(levels), time.time() - start))
+
+# ... and read back by region and by resolution
+levels = open_chunked(os.path.join(output_dir, 'ironchef_chunked'))
+start = time.time()
+region = levels[0][1000:1300, 1500:1900]
+print('region', region.shape, 'in %.3f s,' % (time.time() - start),
+      'equal:', np.array_equal(region, large[1000:1300, 1500:1900]))
+start = time.time()
+preview = np.asarray(levels[-1])
+print('preview', preview.shape, 'in %.3f s' % (time.time() - start))
+
+fig, axes = plt.subplots(1, 2)
+axes[0].imshow(region)
+axes[0].axis('off')
+axes[0].set_title('Full resolution region')
+axes[1].imshow(preview)
+axes[1].axis('off')
+axes[1].set_title('Preview level')
+plt.show()
+
+
+# Decode cache
+'''
+Every script here decodes the same files in images/ again on every run. imread_cached() decodes a file once and keeps the array as a .npy file in cache_dir (decode_cache in output_dir, relative to the working directory like every output here); later calls, from any process, return it with np.load(mmap_mode='r'), so there is no decode and the pages are shared through the OS file cache. The arrays are read-only.
+
+- The cache key is the absolute path, size and modification time of the file (or, with hash_content=True, a hash of its bytes) plus the imread keyword arguments, so a changed file is decoded again.
+- Entries are written to a temporary file and renamed into place, so concurrent readers see either no entry or a complete one.
+- A hit touches the entry; when the cache grows over max_bytes, the least recently used entries are removed, except the one just returned. On POSIX, removing a file another process has mapped is safe: its mapping stays valid.
+- Temporary files older than cache_tmp_max_age, left behind by a writer that crashed, are removed at the same time.
+'''
+import hashlib
+import threading
+
+cache_dir = os.path.join(output_dir, 'decode_cache')
+cache_max_bytes = 2**30
+cache_tmp_max_age = 3600  # seconds
+
+
+def _cache_key(path, hash_content, kwargs):
+    key = hashlib.sha1(repr(sorted(kwargs.items())).encode())
+    if hash_content:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                key.update(block)
+    else:
+        stat = os.stat(path)
+        key.update(('%s|%d|%d' % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)).encode())
+    return key.hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:  # already removed, or still mapped on Windows
+        return False
+    return True
+
+
+def _evict(directory, max_bytes, keep=None):
+    """
+    Remove the least recently used entries other than keep until directory
+    holds max_bytes, and stale temporary files.
+    """
+    entries = []
+    total = 0
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:  # evicted by another process
+            continue
+        if name.endswith('.tmp') and now - stat.st_mtime > cache_tmp_max_age:
+            _remove(path)
+        elif name.endswith('.npy'):
+            total += stat.st_size
+            if name != keep:
+                entries.append((stat.st_mtime, stat.st_size, name))
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if _remove(os.path.join(directory, name)):
+            total -= size
+
+
+def imread_cached(path, directory=None, max_bytes=None, hash_content=False, **kwargs):
+    """
+    io.imread(path, **kwargs) through the decode cache, as a read-only
+    memory-mapped array.
+    """
+    directory = cache_dir if directory is None else directory
+    max_bytes = cache_max_bytes if max_bytes is None else max_bytes
+    entry = os.path.join(directory, _cache_key(path, hash_content, kwargs) + '.npy')
+    try:
+        image = np.load(entry, mmap_mode='r')
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            os.utime(entry)  # most recently used
+        except OSError:  # evicted since; the mapping stays valid
+            pass
+        return image
+    image = io.imread(path, **kwargs)
+    os.makedirs(directory, exist_ok=True)
+    tmp = '%s.%d.%d.tmp' % (entry, os.getpid(), threading.get_ident())
+    with open(tmp, 'wb') as f:
+        np.save(f, image)
+    os.replace(tmp, entry)
+    try:
+        cached = np.load(entry, mmap_mode='r')
+    except FileNotFoundError:  # evicted by another process already
+        image.setflags(write=False)
+        cached = image
+    _evict(directory, max_bytes, keep=os.path.basename(entry))
+    return cached
+
+
+for i in range(2):
+    start = time.time()
+    cached = imread_cached('./images/ironchef.jpg')
+    print('%s: %.4f s' % ('decoded' if i == 0 else 'cached', time.time() - start))
+print(type(cached).__name__, cached.shape, np.array_equal(cached, image_ironchef))
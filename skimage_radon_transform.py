@@ -53,3 +53,380 @@ ax1.imshow(reconstruction_fbp, cmap=plt.cm.Greys_r)
 ax2.set_title("Reconstruction error\nFiltered back projection")
 ax2.imshow(reconstruction_fbp - image, cmap=plt.cm.Greys_r, **imkwargs)
 plt.show()
+
+# Precomputed projection operator
+'''
+For a fixed image shape and set of angles the Radon transform is one and the same linear operator, yet radon() rebuilds it for every image by rotating and summing once per angle. When a whole CT stack of slices is projected with the same geometry, it pays to build that operator once as a sparse matrix A. Each row of A holds the bilinear weights radon() uses to sample the rotated image along one ray, so A @ image.ravel() is the sinogram. Projecting a stack of slices is then a single sparse-dense matrix product, and the transpose A.T is the (unfiltered) backprojector.
+
+The matrix depends only on (shape, theta, circle), so it is kept in memory per geometry and can also be saved to disk and loaded on the next run.
+'''
+import os
+import time
+import hashlib
+from scipy import sparse
+
+_radon_matrices = {}
+
+
+def radon_matrix(shape, theta, circle=True, cache_dir=None):
+    """
+    Return the sparse (n_detectors * n_angles, rows * cols) Radon matrix.
+
+    Rows are ordered detector-major, so the product reshapes to a sinogram
+    with the same layout as radon(). The matrix is cached per geometry in
+    memory and, if cache_dir is given, as an .npz file on disk.
+    """
+    rows, cols = shape
+    theta = np.asarray(theta, dtype=np.float64)
+    key = (rows, cols, theta.tobytes(), bool(circle))
+    if key in _radon_matrices:
+        return _radon_matrices[key]
+
+    path = None
+    if cache_dir is not None:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, 'radon_matrix_%s.npz' % digest)
+        if os.path.exists(path):
+            _radon_matrices[key] = sparse.load_npz(path)
+            return _radon_matrices[key]
+
+    # Same square frame as radon(): crop to the inscribed square when
+    # circle=True, otherwise zero-pad to the diagonal.
+    if circle:
+        size = min(shape)
+        offset = [int(np.ceil((s - size) / 2)) for s in shape]
+    else:
+        size = int(np.ceil(np.sqrt(2) * max(shape)))
+        offset = [s // 2 - size // 2 for s in shape]
+    center = size // 2
+    n_angles = len(theta)
+
+    rr, cc = np.mgrid[:size, :size].astype(np.float64)
+    row_ids, col_ids, weights = [], [], []
+    for i, angle in enumerate(np.deg2rad(theta)):
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        x = cos_a * cc + sin_a * rr - center * (cos_a + sin_a - 1)
+        y = -sin_a * cc + cos_a * rr - center * (cos_a - sin_a - 1)
+        x0, y0 = np.floor(x), np.floor(y)
+        fx, fy = x - x0, y - y0
+        for dy, dx, w in ((0, 0, (1 - fy) * (1 - fx)), (0, 1, (1 - fy) * fx),
+                          (1, 0, fy * (1 - fx)), (1, 1, fy * fx)):
+            py, px = y0 + dy, x0 + dx
+            valid = ((w > 0) & (py >= 0) & (py < size) & (px >= 0) & (px < size))
+            py = py[valid].astype(np.int64) + offset[0]
+            px = px[valid].astype(np.int64) + offset[1]
+            inside = (py >= 0) & (py < rows) & (px >= 0) & (px < cols)
+            # the detector bin of a ray is its output column cc
+            row_ids.append(cc[valid][inside].astype(np.int64) * n_angles + i)
+            col_ids.append(py[inside] * cols + px[inside])
+            weights.append(w[valid][inside].astype(np.float32))
+
+    A = sparse.coo_matrix((np.concatenate(weights),
+                           (np.concatenate(row_ids), np.concatenate(col_ids))),
+                          shape=(size * n_angles, rows * cols)).tocsr()
+    A.sum_duplicates()
+    _radon_matrices[key] = A
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        sparse.save_npz(path, A)
+    return A
+
+
+def radon_stack(A, images, theta):
+    """
+    Sinograms of an (n_slices, rows, cols) stack in one sparse product.
+    """
+    images = np.asarray(images, dtype=np.float32)
+    n_slices = images.shape[0]
+    sinograms = A @ images.reshape(n_slices, -1).T
+    return sinograms.T.reshape(n_slices, -1, len(theta))
+
+
+def backproject_stack(A, sinograms, shape):
+    """
+    Apply the transpose of A to an (n_slices, n_detectors, n_angles) stack.
+    """
+    sinograms = np.asarray(sinograms, dtype=np.float32)
+    n_slices = sinograms.shape[0]
+    images = A.T @ sinograms.reshape(n_slices, -1).T
+    return images.T.reshape((n_slices,) + tuple(shape))
+
+
+start = time.time()
+output_dir = 'output'
+A = radon_matrix(image.shape, theta, circle=True, cache_dir=output_dir)
+print('Radon matrix: %d x %d, %d non-zeros, built in %.2f s'
+      % (A.shape[0], A.shape[1], A.nnz, time.time() - start))
+
+sinogram_A = radon_stack(A, image[np.newaxis], theta)[0]
+print('max difference to radon(): %.3g' % np.abs(sinogram_A - sinogram).max())
+
+# A small CT stack: the same phantom with varying contrast
+stack = np.stack([image * (1 + 0.1 * k) for k in range(16)])
+
+start = time.time()
+sinograms_loop = [radon(s, theta=theta, circle=True) for s in stack]
+print('radon() per slice: %.2f s' % (time.time() - start))
+
+start = time.time()
+sinograms_stack = radon_stack(A, stack, theta)
+print('sparse operator, whole stack: %.2f s' % (time.time() - start))
+
+backprojections = backproject_stack(A, sinograms_stack, image.shape)
+
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(8, 4.5))
+ax1.set_title("Sinogram\nSparse operator")
+ax1.imshow(sinograms_stack[0], cmap=plt.cm.Greys_r,
+           extent=(0, 180, 0, sinograms_stack.shape[1]), aspect='auto')
+ax2.set_title("Unfiltered backprojection\nTranspose operator")
+ax2.imshow(backprojections[0], cmap=plt.cm.Greys_r)
+fig.tight_layout()
+plt.show()
+
+# Reconstruction of slice stacks: fast FBP and SART
+'''
+iradon() rebuilds the ramp filter on every call and backprojects one angle at a time in float64. When the same geometry is reconstructed over and over, the Fourier-domain filter only depends on the (padded) detector size and the filter name, so it can be computed once and cached. The backprojection itself vectorizes well: for a chunk of angles at once, every output pixel looks up its detector position in each filtered projection and the chunk is summed in float32.
+
+The Simultaneous Algebraic Reconstruction Technique (SART) instead solves A x = b iteratively, using the sparse projection operator from above. Here the angles are split into interleaved subsets and the image is corrected once per subset, which converges in far fewer passes than updating with all angles at once. SART can start from the FBP reconstruction instead of zero (warm start), and stops early once the relative residual |b - A x| / |b| falls below a tolerance or stops improving; it then returns the iterate with the smallest residual.
+
+Slices of a stack are reconstructed in parallel with joblib, FBP in contiguous sub-stacks (so the slices of each share the interpolation positions) and SART one slice per task, and each slice reports its own reconstruction time; for FBP this is its own backprojection plus its share of the work common to the sub-stack.
+'''
+from functools import lru_cache
+from scipy.fft import fft, ifft, fftfreq, fftshift
+from joblib import Parallel, delayed
+
+
+@lru_cache(maxsize=None)
+def fourier_filter(size, filter_name='ramp'):
+    """
+    Fourier-domain FBP filter, computed once per (size, filter_name).
+    """
+    n = np.concatenate((np.arange(1, size / 2 + 1, 2, dtype=int),
+                        np.arange(size / 2 - 1, 0, -2, dtype=int)))
+    f = np.zeros(size)
+    f[0] = 0.25
+    f[1::2] = -1 / (np.pi * n) ** 2
+    fourier_filter = 2 * np.real(fft(f))  # ramp filter
+    if filter_name == 'ramp':
+        pass
+    elif filter_name == 'shepp-logan':
+        omega = np.pi * fftfreq(size)[1:]
+        fourier_filter[1:] *= np.sin(omega) / omega
+    elif filter_name == 'cosine':
+        freq = np.linspace(0, np.pi, size, endpoint=False)
+        fourier_filter *= fftshift(np.sin(freq))
+    elif filter_name == 'hamming':
+        fourier_filter *= fftshift(np.hamming(size))
+    elif filter_name == 'hann':
+        fourier_filter *= fftshift(np.hanning(size))
+    elif filter_name is None:
+        fourier_filter[:] = 1
+    else:
+        raise ValueError('Unknown filter: %s' % filter_name)
+    fourier_filter = fourier_filter.astype(np.float32)[:, np.newaxis]
+    fourier_filter.flags.writeable = False  # shared by every caller
+    return fourier_filter
+
+
+def fbp(sinogram, theta, filter_name='ramp', circle=True, angle_chunk=8,
+        slice_times=None):
+    """
+    Filtered back projection in float32, same geometry and scaling as
+    iradon(). Accepts one sinogram or an (n_slices, n_detectors, n_angles)
+    stack; the interpolation positions of each chunk of angles are
+    computed once and shared by every slice.
+
+    slice_times, an array with one entry per slice, is incremented by the
+    time spent on each slice: its own backprojection plus an equal share
+    of the work shared by all slices.
+    """
+    start_time = time.perf_counter()
+    sinograms = np.asarray(sinogram, dtype=np.float32)
+    single = sinograms.ndim == 2
+    if single:
+        sinograms = sinograms[np.newaxis]
+    n_slices, n_det, n_angles = sinograms.shape
+    if circle:
+        output_size = n_det
+        # zero-pad the detector to the diagonal, as iradon() does
+        diagonal = int(np.ceil(np.sqrt(2) * n_det))
+        pad_before = diagonal // 2 - n_det // 2
+        pad_width = ((0, 0), (pad_before, diagonal - n_det - pad_before), (0, 0))
+        sinograms = np.pad(sinograms, pad_width, mode='constant')
+        n_det = diagonal
+    else:
+        output_size = int(np.floor(np.sqrt(n_det ** 2 / 2.0)))
+
+    padded_size = max(64, int(2 ** np.ceil(np.log2(2 * n_det))))
+    projection = fft(sinograms, n=padded_size, axis=1)
+    projection *= fourier_filter(padded_size, filter_name)
+    # (n_slices, n_angles * n_det): each angle's projection is contiguous
+    filtered = np.real(ifft(projection, axis=1))[:, :n_det]
+    filtered = np.ascontiguousarray(filtered.transpose(0, 2, 1), dtype=np.float32)
+    filtered = filtered.reshape(n_slices, -1)
+
+    radius = output_size // 2
+    xpr, ypr = np.mgrid[:output_size, :output_size].astype(np.float32) - radius
+    angles = np.deg2rad(np.asarray(theta, dtype=np.float64))
+    reconstructed = np.zeros((n_slices, output_size, output_size), dtype=np.float32)
+    own_times = np.zeros(n_slices)
+
+    for start in range(0, n_angles, angle_chunk):
+        chunk = np.arange(start, min(start + angle_chunk, n_angles))
+        cos_a = np.cos(angles[chunk]).astype(np.float32)[:, np.newaxis, np.newaxis]
+        sin_a = np.sin(angles[chunk]).astype(np.float32)[:, np.newaxis, np.newaxis]
+        # detector position of every pixel for every angle in the chunk;
+        # only pixels at the very edge of the output can fall off the
+        # detector, where the filtered projections are close to zero
+        pos = ypr * cos_a - xpr * sin_a
+        pos += n_det // 2
+        np.clip(pos, 0, n_det - 1, out=pos)
+        i0 = pos.astype(np.intp)
+        np.minimum(i0, n_det - 2, out=i0)
+        frac = pos - i0
+        i0 += (chunk * n_det)[:, np.newaxis, np.newaxis]
+        i1 = i0 + 1
+        for k, (values, out) in enumerate(zip(filtered, reconstructed)):
+            slice_start = time.perf_counter()
+            v0 = values.take(i0)
+            v = values.take(i1)
+            v -= v0
+            v *= frac
+            v += v0
+            out += v.sum(axis=0)
+            own_times[k] += time.perf_counter() - slice_start
+
+    if circle:
+        reconstructed[:, (xpr ** 2 + ypr ** 2) > radius ** 2] = 0
+    reconstructed *= np.float32(np.pi / (2 * n_angles))
+    if slice_times is not None:
+        shared_time = time.perf_counter() - start_time - own_times.sum()
+        slice_times += own_times + shared_time / n_slices
+    return reconstructed[0] if single else reconstructed
+
+
+_sart_cache = {}
+
+
+def _sart_subsets(A, n_angles, n_subsets):
+    """
+    Split A into interleaved angle subsets with their SART normalisations.
+    """
+    angle_of_row = np.arange(A.shape[0]) % n_angles
+    subsets = []
+    for s in range(n_subsets):
+        A_s = A[np.flatnonzero(angle_of_row % n_subsets == s)]
+        row_sums = np.asarray(A_s.sum(axis=1)).ravel()
+        col_sums = np.asarray(A_s.sum(axis=0)).ravel()
+        inv_rows = np.divide(1, row_sums, out=np.zeros_like(row_sums),
+                             where=row_sums > 0)
+        inv_cols = np.divide(1, col_sums, out=np.zeros_like(col_sums),
+                             where=col_sums > 0)
+        subsets.append((A_s, A_s.T.tocsr(), inv_rows, inv_cols))
+    return subsets
+
+
+def sart(sinogram, theta, circle=True, n_iter=20, n_subsets=8,
+         relaxation=1.0, tol=1e-3, warm_start=True, filter_name='ramp'):
+    """
+    Ordered-subset SART on the sparse Radon operator.
+
+    Starts from the FBP reconstruction when warm_start is True. Stops
+    after n_iter passes, or earlier once the relative residual drops
+    below tol or no longer decreases. Returns (image, residuals), where
+    image is the iterate with the smallest residual.
+    """
+    sinogram = np.asarray(sinogram, dtype=np.float32)
+    n_angles = len(theta)
+    output_size = sinogram.shape[0]
+    if not circle:
+        output_size = int(np.floor(np.sqrt(sinogram.shape[0] ** 2 / 2.0)))
+    A = radon_matrix((output_size, output_size), theta, circle=circle)
+    if A.shape[0] != sinogram.size:
+        raise ValueError('sinogram shape does not match the reconstruction '
+                         'geometry')
+    key = (id(A), n_subsets)
+    if key not in _sart_cache:
+        _sart_cache[key] = _sart_subsets(A, n_angles, n_subsets)
+    subsets = _sart_cache[key]
+
+    b = sinogram.ravel()
+    if warm_start:
+        x = fbp(sinogram, theta, filter_name=filter_name, circle=circle).ravel()
+    else:
+        x = np.zeros(A.shape[1], dtype=np.float32)
+    angle_of_row = np.arange(A.shape[0]) % n_angles
+    b_subsets = [b[angle_of_row % n_subsets == s] for s in range(n_subsets)]
+
+    b_norm = np.linalg.norm(b)
+    residuals = [np.linalg.norm(b - A @ x) / b_norm]
+    best = x.copy()
+    for _ in range(n_iter):
+        for (A_s, A_s_T, inv_rows, inv_cols), b_s in zip(subsets, b_subsets):
+            correction = A_s_T @ ((b_s - A_s @ x) * inv_rows)
+            x += relaxation * inv_cols * correction
+        residuals.append(np.linalg.norm(b - A @ x) / b_norm)
+        if residuals[-1] < min(residuals[:-1]):
+            best[:] = x
+        if residuals[-1] < tol or residuals[-1] >= residuals[-2]:
+            break
+    return best.reshape(output_size, output_size), residuals
+
+
+def _reconstruct_timed(sinograms, theta, method, kwargs):
+    times = np.zeros(len(sinograms))
+    if method == 'fbp':
+        return fbp(sinograms, theta, slice_times=times, **kwargs), times
+    reconstructions = []
+    for k, sinogram in enumerate(sinograms):
+        start = time.perf_counter()
+        reconstructions.append(sart(sinogram, theta, **kwargs)[0])
+        times[k] = time.perf_counter() - start
+    return reconstructions, times
+
+
+def reconstruct_stack(sinograms, theta, method='fbp', n_jobs=4, **kwargs):
+    """
+    Reconstruct an (n_slices, n_detectors, n_angles) stack in parallel.
+    Returns the reconstructed stack and the time each slice took.
+
+    FBP tasks get contiguous sub-stacks, so that fbp() shares its
+    interpolation positions between their slices; SART runs one slice per
+    task.
+    """
+    if method not in ('fbp', 'sart'):
+        raise ValueError('Unknown reconstruction method: %s' % method)
+    sinograms = np.asarray(sinograms, dtype=np.float32)
+    if method == 'fbp':
+        tasks = np.array_split(np.arange(len(sinograms)),
+                               min(n_jobs, len(sinograms)))
+    else:
+        tasks = [[k] for k in range(len(sinograms))]
+    # threads share the cached filters and sparse operator between slices
+    results = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_reconstruct_timed)(sinograms[task], theta, method, kwargs)
+        for task in tasks)
+    reconstructions = np.concatenate([np.asarray(r) for r, _ in results])
+    times = np.concatenate([t for _, t in results])
+    return reconstructions, times
+
+
+for method in ('fbp', 'sart'):
+    reconstructions, times = reconstruct_stack(sinograms_stack, theta,
+                                               method=method)
+    for k, (reconstruction, elapsed) in enumerate(zip(reconstructions, times)):
+        error = reconstruction - stack[k]
+        print('%s slice %d: rms reconstruction error %.3g, %.3f s'
+              % (method.upper(), k, np.sqrt(np.mean(error**2)), elapsed))
+
+reconstruction_sart, residuals = sart(sinogram, theta)
+print('SART stopped after %d iterations, relative residual %.3g'
+      % (len(residuals) - 1, residuals[-1]))
+
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(8, 4.5),
+                               sharex=True, sharey=True)
+ax1.set_title("Reconstruction\nSART (warm start from FBP)")
+ax1.imshow(reconstruction_sart, cmap=plt.cm.Greys_r)
+ax2.set_title("Reconstruction error\nSART (warm start from FBP)")
+ax2.imshow(reconstruction_sart - image, cmap=plt.cm.Greys_r, **imkwargs)
+plt.show()
@@ -55,4 +55,415 @@ for a in ax.ravel():
     a.set_axis_off()
 
 plt.tight_layout()
-plt.show()
\ No newline at end of file
+plt.show()
+
+# Tiled SLIC for very large images
+'''
+slic() converts the whole image to a floating point Lab image and runs its k-means iterations on one core, which is impossible for whole-slide images that do not fit in memory. SLIC however only ever compares a pixel with the cluster centers within two grid steps of it, so it can be run tile by tile:
+
+1.) cluster centers are placed on one global grid over the full image
+2.) each tile is smoothed (reading a halo around it) and converted to Lab once, into a memory mapped float32 Lab image
+3.) in every iteration each tile assigns its pixels to the nearby centers and returns per-center sums of color and position
+4.) the sums of all tiles are added up to update the shared centers, exactly as one big k-means step would
+5.) after the last iteration the labels are written tile by tile to a memory mapped int32 array
+
+Because every tile assigns against the same global centers, a superpixel crossing a tile seam keeps the same label on both sides. The final connectivity pass (merging small disconnected fragments into a neighbor, like slic(enforce_connectivity=True)) reads each tile with a halo around it, so fragments lying across a seam are seen whole and reassigned consistently by both tiles. Fragments too large to be merged would leave a label in several pieces; a last pass finds the connected components of every tile, joins those touching across a seam with the same label, and gives each piece except the largest of every label a new label, so that every superpixel is connected.
+'''
+import os
+import tempfile
+from scipy import ndimage as ndi
+from joblib import Parallel, delayed
+from skimage.color import rgb2lab
+from skimage.measure import label
+from skimage.util import regular_grid
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def _tile_slices(shape, tile_size):
+    return [(slice(r, min(r + tile_size, shape[0])),
+             slice(c, min(c + tile_size, shape[1])))
+            for r in range(0, shape[0], tile_size)
+            for c in range(0, shape[1], tile_size)]
+
+
+def _lab_tile(image, rows, cols, sigma, path, shape):
+    """
+    Smooth one tile, reading a halo around it, and write it to the float32
+    Lab image at path, as slic() smooths before converting to Lab.
+    """
+    halo = int(4 * sigma + 0.5)
+    r0, c0 = max(rows.start - halo, 0), max(cols.start - halo, 0)
+    r1 = min(rows.stop + halo, image.shape[0])
+    c1 = min(cols.stop + halo, image.shape[1])
+    rgb = img_as_float(np.asarray(image[r0:r1, c0:c1]))
+    if sigma > 0:
+        rgb = ndi.gaussian_filter(rgb, sigma=(sigma, sigma, 0))
+    rgb = rgb[rows.start - r0:rows.stop - r0, cols.start - c0:cols.stop - c0]
+    out = np.memmap(path, dtype=np.float32, mode='r+', shape=shape + (3,))
+    out[rows, cols] = rgb2lab(rgb)
+    out.flush()
+
+
+def _assign_tile(lab_path, shape, rows, cols, centers, step, compactness,
+                 spatial_only=False):
+    """
+    SLIC assignment of one tile against the global centers (y, x, L, a, b).
+    Returns the local labels (global center indices).
+    """
+    lab = np.array(np.memmap(lab_path, dtype=np.float32, mode='r',
+                             shape=shape + (3,))[rows, cols])
+    distance = np.full(lab.shape[:2], np.inf, dtype=np.float32)
+    labels = np.zeros(lab.shape[:2], dtype=np.int32)
+    # a center only competes for pixels within two grid steps of it
+    near = np.flatnonzero((centers[:, 0] > rows.start - 2 * step) &
+                          (centers[:, 0] < rows.stop + 2 * step) &
+                          (centers[:, 1] > cols.start - 2 * step) &
+                          (centers[:, 1] < cols.stop + 2 * step))
+    for k in near:
+        cy, cx = centers[k, :2]
+        y0 = max(int(cy - 2 * step), rows.start)
+        y1 = min(int(cy + 2 * step) + 1, rows.stop)
+        x0 = max(int(cx - 2 * step), cols.start)
+        x1 = min(int(cx + 2 * step) + 1, cols.stop)
+        if y0 >= y1 or x0 >= x1:
+            continue
+        window = (slice(y0 - rows.start, y1 - rows.start),
+                  slice(x0 - cols.start, x1 - cols.start))
+        yy, xx = np.ogrid[y0:y1, x0:x1]
+        d = ((yy - cy) ** 2 + (xx - cx) ** 2) / step ** 2
+        if not spatial_only:
+            color = (lab[window] - centers[k, 2:]) ** 2
+            d = d + color.sum(-1) / compactness ** 2
+        closer = d < distance[window]
+        distance[window][closer] = d[closer]
+        labels[window][closer] = k
+    return labels, lab
+
+
+def _tile_sums(lab_path, shape, rows, cols, centers, step, compactness,
+               spatial_only=False):
+    """
+    Per-center pixel count and sums of (y, x, L, a, b) over one tile.
+    """
+    labels, lab = _assign_tile(lab_path, shape, rows, cols, centers, step,
+                               compactness, spatial_only)
+    used, inverse = np.unique(labels, return_inverse=True)
+    inverse = inverse.ravel()
+    yy, xx = np.mgrid[rows, cols]
+    features = [yy, xx] + [lab[..., c] for c in range(3)]
+    sums = np.stack([np.bincount(inverse, weights=f.ravel(),
+                                 minlength=len(used)) for f in features], 1)
+    return used, np.bincount(inverse, minlength=len(used)), sums
+
+
+def _write_tile(lab_path, rows, cols, centers, step, compactness, path,
+                shape):
+    labels, _ = _assign_tile(lab_path, shape, rows, cols, centers, step,
+                             compactness)
+    out = np.memmap(path, dtype=np.int32, mode='r+', shape=shape)
+    out[rows, cols] = labels
+    out.flush()
+
+
+def _connect_tile(raw_path, path, shape, rows, cols, halo, min_size):
+    """
+    Merge fragments smaller than min_size into the surrounding superpixels,
+    writing only the core of this tile.
+    """
+    raw = np.memmap(raw_path, dtype=np.int32, mode='r', shape=shape)
+    r0, c0 = max(rows.start - halo, 0), max(cols.start - halo, 0)
+    r1, c1 = min(rows.stop + halo, shape[0]), min(cols.stop + halo, shape[1])
+    labels = np.array(raw[r0:r1, c0:c1])
+    fragments = label(labels, background=-1, connectivity=1)
+    sizes = np.bincount(fragments.ravel())
+    # fragments reaching the edge of the halo may continue outside of it
+    edges = [fragments[0] if r0 > 0 else [],
+             fragments[-1] if r1 < shape[0] else [],
+             fragments[:, 0] if c0 > 0 else [],
+             fragments[:, -1] if c1 < shape[1] else []]
+    edge = np.unique(np.concatenate(edges)).astype(np.intp)
+    small = sizes < min_size
+    small[0] = False
+    small[edge] = False
+    # every pixel of a small fragment takes the label of the nearest pixel
+    # belonging to a large one
+    nearest = ndi.distance_transform_edt(small[fragments],
+                                         return_distances=False,
+                                         return_indices=True)
+    result = labels[tuple(nearest)]
+    out = np.memmap(path, dtype=np.int32, mode='r+', shape=shape)
+    out[rows, cols] = result[rows.start - r0:rows.stop - r0,
+                             cols.start - c0:cols.stop - c0]
+    out.flush()
+
+
+def _tile_components(path, shape, rows, cols):
+    """
+    Connected components of one tile of the label image: their sizes,
+    labels, and component ids along the top, bottom, left and right edges.
+    """
+    labels = np.array(np.memmap(path, dtype=np.int32, mode='r',
+                                shape=shape)[rows, cols])
+    components = label(labels, background=-1, connectivity=1) - 1
+    sizes = np.bincount(components.ravel())
+    component_labels = np.empty(len(sizes), dtype=np.int64)
+    component_labels[components.ravel()] = labels.ravel()
+    return sizes, component_labels, (components[0], components[-1],
+                                      components[:, 0], components[:, -1])
+
+
+def _split_fragments(tiles, pieces, n_labels):
+    """
+    New label of every tile component (numbered tile after tile): the
+    components are joined across tile seams into fragments, each label
+    keeps its largest fragment and the other fragments get new labels.
+    """
+    offsets = np.cumsum([0] + [len(sizes) for sizes, _, _ in pieces])
+    sizes = np.concatenate([sizes for sizes, _, _ in pieces])
+    labels = np.concatenate([labels for _, labels, _ in pieces])
+    tile_at = {(rows.start, cols.start): k for k, (rows, cols) in enumerate(tiles)}
+    first, second = [], []
+    for k, (rows, cols) in enumerate(tiles):
+        top, bottom, left, right = pieces[k][2]
+        below = tile_at.get((rows.stop, cols.start))
+        if below is not None:
+            first.append(bottom + offsets[k])
+            second.append(pieces[below][2][0] + offsets[below])
+        beside = tile_at.get((rows.start, cols.stop))
+        if beside is not None:
+            first.append(right + offsets[k])
+            second.append(pieces[beside][2][2] + offsets[beside])
+    first = np.concatenate(first + [np.zeros(0, dtype=np.intp)])
+    second = np.concatenate(second + [np.zeros(0, dtype=np.intp)])
+    touching = labels[first] == labels[second]
+    graph = coo_matrix((np.ones(touching.sum()),
+                        (first[touching], second[touching])),
+                       shape=(len(sizes), len(sizes)))
+    _, fragments = connected_components(graph, directed=False)
+    fragment_sizes = np.bincount(fragments, weights=sizes)
+    fragment_labels = np.empty(len(fragment_sizes), dtype=np.int64)
+    fragment_labels[fragments] = labels
+    # sorted by label, largest fragment first
+    order = np.lexsort((-fragment_sizes, fragment_labels))
+    extra = order[1:][fragment_labels[order][1:] == fragment_labels[order][:-1]]
+    fragment_labels[extra] = n_labels + np.arange(len(extra))
+    return fragment_labels[fragments]
+
+
+def _relabel_tile(path, shape, rows, cols, new_labels):
+    labels = np.array(np.memmap(path, dtype=np.int32, mode='r',
+                                shape=shape)[rows, cols])
+    components = label(labels, background=-1, connectivity=1) - 1
+    out = np.memmap(path, dtype=np.int32, mode='r+', shape=shape)
+    out[rows, cols] = new_labels[components]
+    out.flush()
+
+
+def slic_tiled(image, n_segments=250, compactness=10, sigma=1, max_iter=10,
+               tile_size=2048, out_path=None, n_jobs=4, min_size_factor=0.5):
+    """
+    SLIC over overlapping tiles with shared global centers. image can be
+    any (rows, cols, 3) array-like, e.g. a np.memmap; the labels are
+    returned as an int32 np.memmap written to out_path.
+    """
+    shape = image.shape[:2]
+    # the same grid of initial centers as slic()
+    grid = regular_grid((1,) + shape, n_segments)[1:]
+    step = max(int(s.step) for s in grid)
+    cy, cx = np.mgrid[grid[0].start:shape[0]:grid[0].step,
+                      grid[1].start:shape[1]:grid[1].step]
+    centers = np.zeros((cy.size, 5))
+    centers[:, 0], centers[:, 1] = cy.ravel(), cx.ravel()
+
+    tiles = _tile_slices(shape, tile_size)
+    if out_path is None:
+        out_path = os.path.join(tempfile.mkdtemp(), 'slic_labels.int32')
+    raw_path = out_path + '.raw'
+    lab_path = out_path + '.lab'
+    with Parallel(n_jobs=n_jobs) as parallel:
+        # every tile is smoothed and converted to Lab only once
+        np.memmap(lab_path, dtype=np.float32, mode='w+',
+                  shape=shape + (3,)).flush()
+        parallel(delayed(_lab_tile)(image, rows, cols, sigma, lab_path, shape)
+                 for rows, cols in tiles)
+
+        # like slic(), a first spatial-only pass gives the centers their
+        # initial colors, followed by the k-means iterations
+        for iteration in range(max_iter + 1):
+            counts = np.zeros(len(centers))
+            sums = np.zeros_like(centers)
+            for used, c, s in parallel(
+                    delayed(_tile_sums)(lab_path, shape, rows, cols, centers,
+                                        step, compactness, iteration == 0)
+                    for rows, cols in tiles):
+                counts[used] += c
+                sums[used] += s
+            found = counts > 0
+            centers[found] = sums[found] / counts[found, np.newaxis]
+
+        np.memmap(raw_path, dtype=np.int32, mode='w+', shape=shape).flush()
+        parallel(delayed(_write_tile)(lab_path, rows, cols, centers, step,
+                                      compactness, raw_path, shape)
+                 for rows, cols in tiles)
+        np.memmap(out_path, dtype=np.int32, mode='w+', shape=shape).flush()
+        min_size = int(min_size_factor * shape[0] * shape[1] / len(centers))
+        parallel(delayed(_connect_tile)(raw_path, out_path, shape, rows,
+                                        cols, 2 * step, min_size)
+                 for rows, cols in tiles)
+
+        # fragments too large to merge become superpixels of their own
+        pieces = parallel(delayed(_tile_components)(out_path, shape, rows, cols)
+                          for rows, cols in tiles)
+        new_labels = _split_fragments(tiles, pieces, len(centers))
+        offsets = np.cumsum([0] + [len(sizes) for sizes, _, _ in pieces])
+        parallel(delayed(_relabel_tile)(out_path, shape, rows, cols,
+                                        new_labels[offsets[k]:offsets[k + 1]])
+                 for k, (rows, cols) in enumerate(tiles))
+    os.remove(raw_path)
+    os.remove(lab_path)
+    return np.memmap(out_path, dtype=np.int32, mode='r', shape=shape)
+
+
+segments_tiled = slic_tiled(img, n_segments=250, compactness=10, sigma=1,
+                            tile_size=128)
+# fraction of pixels in the tiled superpixel's best matching SLIC segment
+n_slic = segments_slic.max() + 1
+overlap = np.bincount(segments_tiled.ravel().astype(np.int64) * n_slic +
+                      segments_slic.ravel(),
+                      minlength=(segments_tiled.max() + 1) * n_slic)
+overlap = overlap.reshape(-1, n_slic).max(axis=1).sum()
+print('Tiled SLIC number of segments: {}'.format(len(np.unique(segments_tiled))))
+print('Tiled SLIC agreement with SLIC: {:.1%}'.format(overlap / segments_slic.size))
+
+fig, ax = plt.subplots(1, 2, figsize=(10, 5), sharex=True, sharey=True)
+ax[0].imshow(mark_boundaries(img, segments_slic))
+ax[0].set_title('SLIC')
+ax[1].imshow(mark_boundaries(img, np.asarray(segments_tiled)))
+ax[1].set_title('Tiled SLIC (128 x 128 tiles)')
+for a in ax:
+    a.set_axis_off()
+plt.tight_layout()
+plt.show()
+
+# Label statistics in one pass
+'''
+Counting segments with len(np.unique(segments)) sorts a copy of the whole label image, and mark_boundaries() then scans it again. For label images of hundreds of megapixels both are wasteful: labels are small non-negative integers, so a single np.bincount over the flattened image gives the pixel count of every label in O(n) without sorting. The labels in use are the non-zero bins, and a lookup table built from them maps the labels to a compact range 0..K-1 (apply it with relabel[labels]). Boundary pixels are those whose label differs from the pixel to their right or below, which is two shifted comparisons.
+'''
+from skimage.segmentation import find_boundaries
+
+
+def label_statistics(labels, boundaries=True):
+    """
+    Return (used labels, per-label pixel counts, compact relabeling map,
+    boundary mask) of a non-negative integer label image.
+
+    counts[i] is the number of pixels of used[i], and relabel[used[i]] == i.
+    The boundary mask matches find_boundaries(labels, mode='thick').
+    """
+    labels = np.asarray(labels)
+    if labels.dtype.kind not in 'iu':
+        raise ValueError('labels must be an integer image')
+    # ravel() of a contiguous image is a view, not a copy
+    counts = np.bincount(labels.ravel())
+    used = np.flatnonzero(counts)
+    # signed, so that unused labels can map to -1 for unsigned images too
+    relabel = np.full(len(counts), -1, dtype=np.intp)
+    relabel[used] = np.arange(len(used))
+
+    boundary = None
+    if boundaries:
+        boundary = np.zeros(labels.shape, dtype=bool)
+        for axis in range(labels.ndim):
+            before = [slice(None)] * labels.ndim
+            after = [slice(None)] * labels.ndim
+            before[axis], after[axis] = slice(None, -1), slice(1, None)
+            before, after = tuple(before), tuple(after)
+            differ = labels[before] != labels[after]
+            boundary[before] |= differ
+            boundary[after] |= differ
+    return used, counts[used], relabel, boundary
+
+
+for name, segments in [('Felzenszwalb', segments_fz), ('SLIC', segments_slic),
+                       ('Quickshift', segments_quick),
+                       ('Compact watershed', segments_watershed)]:
+    used, counts, relabel, boundary = label_statistics(segments)
+    assert (boundary == find_boundaries(segments, mode='thick')).all()
+    print('{} number of segments: {}, sizes {} to {} pixels'.format(
+        name, len(used), counts.min(), counts.max()))
+
+# unsigned label images work the same
+used, counts, relabel, boundary = label_statistics(segments_slic.astype(np.uint16))
+assert (relabel[segments_slic] == label_statistics(segments_slic)[2][segments_slic]).all()
+assert (boundary == find_boundaries(segments_slic, mode='thick')).all()
+
+# Compact labels 0..K-1 and the boundaries drawn without mark_boundaries
+used, counts, relabel, boundary = label_statistics(segments_watershed)
+segments_compact = relabel[segments_watershed]
+img_marked = img.copy()
+img_marked[boundary] = (1, 1, 0)
+
+fig, ax = plt.subplots(1, 2, figsize=(10, 5), sharex=True, sharey=True)
+ax[0].imshow(segments_compact, cmap=plt.cm.nipy_spectral)
+ax[0].set_title('Compact labels 0..{}'.format(len(used) - 1))
+ax[1].imshow(img_marked)
+ax[1].set_title('Boundary pixels')
+for a in ax:
+    a.set_axis_off()
+plt.tight_layout()
+plt.show()
+
+# Decoding at reduced resolution
+'''
+astronaut()[::2, ::2] above decodes the full image and then throws three quarters of it away (and picks every other pixel instead of averaging, which aliases). imread_reduced() asks for the smaller image directly. A JPEG stores 8 x 8 blocks of DCT coefficients, and PIL's draft mode lets the decoder use only the low frequency coefficients of every block, giving the image at 1/2, 1/4 or 1/8 of its size. The full resolution image never exists, so memory drops with the square of the scale; decode time drops less (about two times at 1/8), because all coefficients still have to be entropy decoded. Other formats (PNG, like the astronaut) have to be decoded completely, and are reduced by averaging each factor x factor block, which PIL does in C without a float copy.
+'''
+import time
+from PIL import Image
+from skimage import data_dir
+
+
+def imread_reduced(fname, scale=0.5):
+    """
+    Decode fname at scale (1, 1/2, 1/4 or 1/8) of its size: in the DCT
+    domain for JPEG, by area averaging for other formats.
+    """
+    factor = int(round(1 / scale))
+    if factor not in (1, 2, 4, 8):
+        raise ValueError('scale must be 1, 1/2, 1/4 or 1/8')
+    with Image.open(fname) as im:
+        size = (-(-im.size[0] // factor), -(-im.size[1] // factor))
+        if im.format == 'JPEG':
+            im.draft(im.mode, size)
+        # whatever the decoder could not reduce is averaged
+        remaining = int(round(im.size[0] / size[0]))
+        if remaining > 1:
+            im = im.reduce(remaining)
+        return np.asarray(im)
+
+
+start = time.time()
+img_decimated = astronaut()[::2, ::2]
+print('astronaut()[::2, ::2]: %.3f s' % (time.time() - start))
+start = time.time()
+img_reduced = imread_reduced(os.path.join(data_dir, 'astronaut.png'), 0.5)
+print('imread_reduced(astronaut, 1/2): %.3f s, shape %s'
+      % (time.time() - start, img_reduced.shape))
+
+for scale in (1, 0.5, 0.25, 0.125):
+    start = time.time()
+    photo = imread_reduced('./images/landscape_lowlight.JPG', scale)
+    print('landscape_lowlight.JPG at %g: %.3f s, %s, %.1f MB'
+          % (scale, time.time() - start, photo.shape, photo.nbytes / 2**20))
+
+fig, ax = plt.subplots(1, 3, figsize=(15, 5))
+ax[0].imshow(img_decimated)
+ax[0].set_title('astronaut()[::2, ::2]')
+ax[1].imshow(img_reduced)
+ax[1].set_title('Area average (PNG)')
+ax[2].imshow(photo)
+ax[2].set_title('JPEG decoded at 1/8')
+for a in ax:
+    a.set_axis_off()
+plt.tight_layout()
+plt.show()
@@ -0,0 +1,163 @@
+'''
+Scaling of the superpixel algorithms with image size
+
+skimage_superpixels.py runs each superpixel method once on a half-resolution astronaut. To choose between them under throughput constraints we need to know how they scale: how runtime and memory grow with the number of pixels and with each method's key parameter (n_segments for SLIC, kernel_size for quickshift, scale for Felzenszwalb, the number of markers for compact watershed).
+
+This script builds test images from 0.25 to 50 megapixels by tiling the astronaut image, runs every method and parameter at every size and records the runtime (best of a few runs), the peak memory and the number of segments. Memory and segments come from a first run under tracemalloc, which also serves as the warm-up; the timed runs that follow are untraced. For each method it fits a power law, time = a * MP**b, on a log-log scale: b close to 1 means linear scaling. Slow methods (quickshift in particular) stop at the first size that exceeds a time budget, and their fitted curve is used to extrapolate.
+
+The results are compared with a baseline, baseline_file next to this script, so that a slowdown or a change in segment count after an upgrade is reported as a regression. The baseline is only written when save_baseline is set; without a baseline nothing is compared.
+'''
+
+import os
+import json
+import time
+import tracemalloc
+import numpy as np
+
+from skimage.data import astronaut
+from skimage.color import rgb2gray
+from skimage.filters import sobel
+from skimage.segmentation import felzenszwalb, slic, quickshift, watershed
+from skimage.util import img_as_float
+
+sizes_mp = [0.25, 1, 4, 16, 50]
+time_budget = 120  # seconds; larger sizes are skipped once a run exceeds it
+repeat = 3  # timings are the best of this many runs
+baseline_file = 'superpixels_baseline.json'
+save_baseline = False  # set to write this run to baseline_file
+regression_tolerance = 0.25  # flag runs more than 25% slower than baseline
+
+
+def watershed_compact(img, markers=250):
+    gradient = sobel(rgb2gray(img))
+    return watershed(gradient, markers=markers, compactness=0.001)
+
+
+# (method name, function, fixed keyword arguments, key parameter, values)
+methods = [
+    ('felzenszwalb', felzenszwalb, dict(sigma=0.5, min_size=50),
+     'scale', [100, 400]),
+    ('slic', slic, dict(compactness=10, sigma=1),
+     'n_segments', [250, 2500]),
+    ('quickshift', quickshift, dict(max_dist=6, ratio=0.5),
+     'kernel_size', [3, 5]),
+    ('watershed', watershed_compact, dict(),
+     'markers', [250, 2500]),
+]
+
+
+def test_image(megapixels):
+    """
+    Float RGB image of about megapixels, tiled from the astronaut.
+    """
+    tile = astronaut()
+    side = int(np.sqrt(megapixels * 1e6))
+    reps = (side // tile.shape[0] + 1, side // tile.shape[1] + 1, 1)
+    return img_as_float(np.tile(tile, reps)[:side, :side])
+
+
+def run_one(func, img, kwargs, repeat=repeat):
+    """
+    Peak memory and segment count of func(img, **kwargs) from a traced
+    first run, then its best runtime over up to repeat untraced runs.
+    """
+    tracemalloc.start()
+    segments = func(img, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    runtime = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(img, **kwargs)
+        runtime = min(runtime, time.perf_counter() - start)
+        if runtime > time_budget:
+            break  # a second run of a method this slow tells us nothing new
+    return dict(runtime=runtime, peak_memory_mb=peak / 2**20,
+                n_segments=len(np.unique(segments)))
+
+
+def run_benchmarks():
+    results = []
+    for megapixels in sizes_mp:
+        img = test_image(megapixels)
+        for name, func, kwargs, param, values in methods:
+            for value in values:
+                if any(r['method'] == name and r['value'] == value and
+                       r['runtime'] > time_budget for r in results):
+                    continue  # already over budget at a smaller size
+                result = dict(method=name, param=param, value=value,
+                              megapixels=img.shape[0] * img.shape[1] / 1e6)
+                result.update(run_one(func, img, dict(kwargs, **{param: value})))
+                results.append(result)
+                print('{method:12s} {param}={value:<5} {megapixels:6.2f} MP: '
+                      '{runtime:8.2f} s, {peak_memory_mb:8.1f} MB, '
+                      '{n_segments} segments'.format(**result))
+        del img
+    return results
+
+
+def fit_scaling(results):
+    """
+    Fit runtime = a * MP**b and memory = c * MP per (method, value).
+    """
+    fits = {}
+    for name, _, _, param, values in methods:
+        for value in values:
+            runs = [r for r in results
+                    if r['method'] == name and r['value'] == value]
+            if len(runs) < 2:
+                continue
+            mp = np.array([r['megapixels'] for r in runs])
+            runtime = np.array([r['runtime'] for r in runs])
+            memory = np.array([r['peak_memory_mb'] for r in runs])
+            b, log_a = np.polyfit(np.log(mp), np.log(runtime), 1)
+            fits[(name, param, value)] = dict(
+                a=np.exp(log_a), b=b,
+                memory_per_mp=np.sum(memory * mp) / np.sum(mp * mp))
+    return fits
+
+
+def compare_to_baseline(results, path=baseline_file, save_baseline=False):
+    """
+    Return the runs that got slower or changed their segment count since
+    the baseline at path (None without one), or overwrite it with results
+    if save_baseline.
+    """
+    key = '{method}/{param}={value}/{megapixels:.2f}MP'.format
+    if save_baseline:
+        with open(path, 'w') as f:
+            json.dump({key(**r): r for r in results}, f, indent=1)
+        print('Saved baseline to %s' % path)
+        return None
+    if not os.path.exists(path):
+        print('No baseline at %s, set save_baseline to write one' % path)
+        return None
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for r in results:
+        base = baseline.get(key(**r))
+        if base is None:
+            continue
+        slower = r['runtime'] > base['runtime'] * (1 + regression_tolerance)
+        if slower or r['n_segments'] != base['n_segments']:
+            regressions.append((key(**r), base, r))
+    return regressions
+
+
+results = run_benchmarks()
+
+print('\nScaling fits: runtime = a * MP**b')
+for (name, param, value), fit in fit_scaling(results).items():
+    print('{:12s} {}={:<5} a={:0.3g} s, b={:0.2f}, '
+          '{:0.0f} MB per MP, 50 MP in ~{:0.0f} s'.format(
+              name, param, value, fit['a'], fit['b'], fit['memory_per_mp'],
+              fit['a'] * 50 ** fit['b']))
+
+regressions = compare_to_baseline(results, save_baseline=save_baseline)
+for name, base, r in regressions or []:
+    print('REGRESSION %s: %.2f s -> %.2f s, %d -> %d segments'
+          % (name, base['runtime'], r['runtime'],
+             base['n_segments'], r['n_segments']))
+if regressions == []:
+    print('No regressions against the baseline.')